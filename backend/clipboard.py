@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import re
 import time
 
 import win32clipboard
@@ -19,6 +20,18 @@ _KNOWN_FORMATS: dict[int, str] = {
     CF_HTML: "HTML Format",
 }
 
+# CF_HTML header field giving the byte offset of the HTML document. The
+# header is a handful of short ASCII lines, so only its first KiB is searched.
+_START_HTML_RE = re.compile(rb"StartHTML:(\d+)")
+_HTML_TAG_RE = re.compile(rb"<html", re.IGNORECASE)
+_HEADER_SCAN_LIMIT = 1024
+
+# The debug view is for eyeballing clipboard contents, so cap what it returns.
+# Decoding a few extra bytes leaves slack for multi-byte UTF-8 sequences.
+_DEBUG_HTML_CHARS = 50_000
+_DEBUG_HTML_BYTES = 60_000
+_DEBUG_TEXT_CHARS = 30_000
+
 
 def _open_clipboard(retries: int = 5, delay: float = 0.05) -> None:
     """Open the clipboard with retries to handle transient lock contention."""
@@ -32,6 +45,19 @@ def _open_clipboard(retries: int = 5, delay: float = 0.05) -> None:
             time.sleep(delay)
 
 
+def clipboard_has_html() -> bool:
+    """Return True if the clipboard currently holds CF_HTML data.
+
+    A single availability check, without enumerating and naming every format
+    like read_clipboard_debug does.
+    """
+    _open_clipboard()
+    try:
+        return bool(win32clipboard.IsClipboardFormatAvailable(CF_HTML))
+    finally:
+        win32clipboard.CloseClipboard()
+
+
 def read_clipboard_debug() -> dict:
     """Return debug info about clipboard contents: available formats and raw HTML."""
     _open_clipboard()
@@ -55,7 +81,9 @@ def read_clipboard_debug() -> dict:
         if win32clipboard.IsClipboardFormatAvailable(CF_HTML):
             try:
                 raw: bytes = win32clipboard.GetClipboardData(CF_HTML)
-                raw_html = raw.decode("utf-8", errors="replace")
+                raw_html = raw[:_DEBUG_HTML_BYTES].decode("utf-8", errors="replace")
+                if len(raw) > _DEBUG_HTML_BYTES or len(raw_html) > _DEBUG_HTML_CHARS:
+                    raw_html = raw_html[:_DEBUG_HTML_CHARS] + f"\n(truncated, {len(raw)} bytes total)"
             except Exception:
                 raw_html = "(failed to read)"
 
@@ -63,11 +91,11 @@ def read_clipboard_debug() -> dict:
         plain_text = ""
         if win32clipboard.IsClipboardFormatAvailable(13):  # CF_UNICODETEXT
             try:
-                plain_text = win32clipboard.GetClipboardData(13)
+                plain_text = win32clipboard.GetClipboardData(13)[:_DEBUG_TEXT_CHARS]
             except Exception:
                 plain_text = "(failed to read)"
 
-        has_html = any(f["name"] == "HTML Format" for f in formats)
+        has_html = bool(win32clipboard.IsClipboardFormatAvailable(CF_HTML))
 
         return {
             "formats": formats,
@@ -98,17 +126,19 @@ def read_clipboard_html() -> str | None:
         if not win32clipboard.IsClipboardFormatAvailable(CF_HTML):
             return None
         raw: bytes = win32clipboard.GetClipboardData(CF_HTML)
-        text = raw.decode("utf-8", errors="replace")
         # CF_HTML has a header like "Version:0.9\nStartHTML:..."
-        # The actual HTML starts after "StartHTML:<offset>"
-        idx = text.find("<html") if "<html" in text.lower() else text.find("<HTML")
-        if idx == -1:
-            # fallback: look for StartHTML offset
-            for line in text.splitlines():
-                if line.startswith("StartHTML:"):
-                    idx = int(line.split(":")[1])
-                    break
-        return text[idx:] if idx >= 0 else text
+        # The actual HTML starts at the byte offset given by StartHTML.
+        # Work on the raw bytes so only the kept slice gets decoded.
+        start = 0
+        m = _START_HTML_RE.search(raw, 0, _HEADER_SCAN_LIMIT)
+        if m and int(m.group(1)) < len(raw):
+            start = int(m.group(1))
+        else:
+            # fallback: look for the <html> tag itself
+            tag = _HTML_TAG_RE.search(raw)
+            if tag:
+                start = tag.start()
+        return raw[start:].decode("utf-8", errors="replace")
     except Exception:
         return None
     finally:
@@ -3,15 +3,22 @@
 from __future__ import annotations
 
 import re
+from functools import lru_cache
+
+from lxml.html import fragment_fromstring
 
 from clipboard import read_clipboard_html
-from html_to_html import node_to_html
-from html_to_latex import node_to_latex, _escape_latex
-from html_to_markdown import node_to_markdown
-from omml_to_latex import omml_to_latex
+from html_to_html import clean_tree, node_to_html
+from html_to_latex import node_to_latex, tree_to_latex, _escape_latex
+from html_to_markdown import node_to_markdown, tree_to_markdown
+from math_cache import cached_math, remember_math, uncached_math
+from omml_to_latex import try_omml_batch_to_latex
 from parser import DocNode, NodeType, parse_clipboard_html
 from postprocess import postprocess_latex
 
+_CODE_FENCE_RE = re.compile(r'```[^\n]*\n.*?```', re.DOTALL)
+_WS_RE = re.compile(r'\s+')
+
 
 def convert_clipboard() -> dict:
     """Read the Windows clipboard and convert to all output formats."""
@@ -43,16 +50,17 @@ def convert_html(html: str) -> dict:
     md_parts: list[str] = []
     html_parts: list[str] = []
 
+    _prefetch_math(nodes)
     for node in nodes:
         _convert_node(node, latex_parts, md_parts, html_parts, warnings)
 
-    markdown = "\n\n".join(p for p in md_parts if p.strip()).strip()
+    markdown = "\n\n".join([p for p in md_parts if p.strip()]).strip()
     markdown = _fix_code_fence_spacing(markdown)
 
     return {
-        "latex": "\n\n".join(p for p in latex_parts if p.strip()).strip(),
+        "latex": "\n\n".join([p for p in latex_parts if p.strip()]).strip(),
         "markdown": markdown,
-        "html": "\n".join(p for p in html_parts if p.strip()).strip(),
+        "html": "\n".join([p for p in html_parts if p.strip()]).strip(),
         "warnings": warnings,
     }
 
@@ -92,31 +100,67 @@ def _convert_node(
         para_html: list[str] = []
         for child in node.children:
             _convert_node(child, para_latex, para_md, para_html, warnings)
-        latex_parts.append(" ".join(p for p in para_latex if p))
-        md_parts.append(" ".join(p for p in para_md if p))
-        html_parts.append("<p>" + " ".join(p for p in para_html if p) + "</p>")
-        return
-
-    if node.type == NodeType.HEADING:
-        latex_parts.append(node_to_latex(node))
-        md_parts.append(node_to_markdown(node))
-        html_parts.append(node_to_html(node))
-        return
-
-    if node.type == NodeType.LIST:
-        latex_parts.append(node_to_latex(node))
-        md_parts.append(node_to_markdown(node))
-        html_parts.append(node_to_html(node))
+        latex_parts.append(" ".join([p for p in para_latex if p]))
+        md_parts.append(" ".join([p for p in para_md if p]))
+        html_parts.append("<p>" + " ".join([p for p in para_html if p]) + "</p>")
         return
 
     if node.type == NodeType.TABLE:
         _convert_table(node, latex_parts, md_parts, html_parts, warnings)
         return
 
-    # Default: text node
-    latex_parts.append(node_to_latex(node))
-    md_parts.append(node_to_markdown(node))
-    html_parts.append(node_to_html(node))
+    # Default: text, heading, and list nodes
+    latex, md, htm = _node_to_all(node)
+    latex_parts.append(latex)
+    md_parts.append(md)
+    html_parts.append(htm)
+
+
+def _node_to_all(node: DocNode) -> tuple[str, str, str]:
+    """Convert a non-math DocNode to (latex, markdown, html)."""
+    if node.type == NodeType.TEXT and node.html:
+        return _convert_fragment(node.html)
+    return node_to_latex(node), node_to_markdown(node), node_to_html(node)
+
+
+@lru_cache(maxsize=1024)
+def _convert_fragment(html: str) -> tuple[str, str, str]:
+    """Convert a formatted HTML fragment to all three formats from one parse."""
+    body = fragment_fromstring(html, create_parent="body")
+    # clean_tree strips Mso* heading classes in place, so it must run last
+    return tree_to_latex(body), tree_to_markdown(body), clean_tree(body)
+
+
+def _iter_math_xml(nodes: list[DocNode]):
+    """Yield the OMML of every math node, including those in paragraphs and tables."""
+    stack = list(reversed(nodes))
+    while stack:
+        node = stack.pop()
+        if node.type in (NodeType.INLINE_MATH, NodeType.DISPLAY_MATH):
+            if node.omml_xml:
+                yield node.omml_xml
+        elif node.type == NodeType.PARAGRAPH:
+            stack.extend(reversed(node.children))
+        elif node.type == NodeType.TABLE:
+            for row in reversed(node.table_rows):
+                for cell in reversed(row):
+                    stack.extend(reversed(cell))
+
+
+def _prefetch_math(nodes: list[DocNode]) -> None:
+    """Convert every not-yet-cached equation in the document with one Pandoc run."""
+    pending = uncached_math(_iter_math_xml(nodes))
+    if len(pending) < 2:
+        return
+    try:
+        results = try_omml_batch_to_latex(pending)
+    except Exception:
+        # Leave them to _convert_math, which reports per-equation warnings.
+        return
+    for xml, (latex, converted) in zip(pending, results):
+        # Plain-text fallbacks stay uncached; _convert_math retries them.
+        if converted:
+            remember_math(xml, postprocess_latex(latex))
 
 
 def _convert_math(node: DocNode, warnings: list[str]) -> str:
@@ -126,8 +170,7 @@ def _convert_math(node: DocNode, warnings: list[str]) -> str:
         return ""
 
     try:
-        raw_latex = omml_to_latex(node.omml_xml)
-        return postprocess_latex(raw_latex)
+        return cached_math(node.omml_xml)
     except RuntimeError as e:
         warnings.append(str(e))
         return ""
@@ -145,7 +188,7 @@ def _fix_code_fence_spacing(md: str) -> str:
     def collapse(m: re.Match) -> str:
         return m.group(0).replace('\n\n', '\n')
 
-    return re.sub(r'```[^\n]*\n.*?```', collapse, md, flags=re.DOTALL)
+    return _CODE_FENCE_RE.sub(collapse, md)
 
 
 def _convert_cell(children: list[DocNode], warnings: list[str]) -> tuple[str, str, str]:
@@ -171,7 +214,13 @@ def _convert_cell(children: list[DocNode], warnings: list[str]) -> tuple[str, st
 
     # Collapse to single line (required for Markdown pipe tables)
     def to_line(parts: list[str]) -> str:
-        return re.sub(r'\s+', ' ', ' '.join(p for p in parts if p.strip())).strip()
+        line = ' '.join([p for p in parts if p.strip()])
+        # Most cells are already single-line. isprintable() is False for every
+        # whitespace character except ' ', so this skips the regex only when
+        # it would be a no-op.
+        if '  ' in line or not line.isprintable():
+            line = _WS_RE.sub(' ', line)
+        return line.strip()
 
     return to_line(cell_latex), to_line(cell_md), to_line(cell_html)
 
@@ -204,27 +253,25 @@ def _convert_table(
 
     num_cols = max(len(r) for r in latex_rows)
 
+    # Row templates are built once per table; cells are padded to num_cols.
     # --- LaTeX: tabular environment ---
     col_spec = "|" + "|".join(["l"] * num_cols) + "|"
+    row_fmt = " & ".join(["{}"] * num_cols) + " \\\\\n\\hline"
     lines = [f"\\begin{{tabular}}{{{col_spec}}}", "\\hline"]
     for row in latex_rows:
-        while len(row) < num_cols:
-            row.append("")
-        lines.append(" & ".join(row) + " \\\\")
-        lines.append("\\hline")
+        row.extend([""] * (num_cols - len(row)))
+        lines.append(row_fmt.format(*row))
     lines.append("\\end{tabular}")
     latex_parts.append("\n".join(lines))
 
     # --- Markdown: pipe table ---
+    md_row_fmt = "| " + " | ".join(["{}"] * num_cols) + " |"
     md_lines = []
-    for i, row in enumerate(md_rows):
-        while len(row) < num_cols:
-            row.append("")
+    for row in md_rows:
+        row.extend([""] * (num_cols - len(row)))
         # Escape pipe characters inside cell content
-        escaped = [c.replace("|", "\\|") for c in row]
-        md_lines.append("| " + " | ".join(escaped) + " |")
-        if i == 0:
-            md_lines.append("| " + " | ".join(["---"] * num_cols) + " |")
+        md_lines.append(md_row_fmt.format(*[c.replace("|", "\\|") for c in row]))
+    md_lines.insert(1, md_row_fmt.format(*["---"] * num_cols))
     md_parts.append("\n".join(md_lines))
 
     # --- HTML: clean table ---
@@ -4,21 +4,39 @@ from __future__ import annotations
 
 import json
 import sqlite3
+import threading
 from datetime import datetime, timezone
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:  # optional C-accelerated JSON; stdlib json is the fallback
+    orjson = None
+
 DB_PATH = Path(__file__).parent / "history.db"
 MAX_PER_TAB = 50
 
+# One connection per thread, opened lazily and kept for the thread's lifetime.
+# FastAPI runs sync endpoints on a worker pool, so each worker reuses its own.
+_local = threading.local()
+
 
 def _connect() -> sqlite3.Connection:
-    conn = sqlite3.connect(str(DB_PATH))
-    conn.row_factory = sqlite3.Row
+    """Return this thread's connection. ``with conn:`` scopes a transaction."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(str(DB_PATH))
+        conn.row_factory = sqlite3.Row
+        # WAL (set once in init_db) keeps commits durable with NORMAL sync,
+        # avoiding an fsync on every insert.
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
     return conn
 
 
 def init_db() -> None:
     with _connect() as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
         conn.execute("""
             CREATE TABLE IF NOT EXISTS history (
                 id          INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -38,6 +56,19 @@ def init_db() -> None:
             conn.execute("ALTER TABLE history ADD COLUMN image TEXT")
         except Exception:
             pass
+        # Trim each tab to its newest MAX_PER_TAB entries inside the INSERT
+        # itself. Recreated on startup so a changed MAX_PER_TAB takes effect.
+        # The subquery is a single idx_tab_time probe and yields NULL (no-op)
+        # while the tab is under the cap.
+        conn.execute("DROP TRIGGER IF EXISTS trim_history")
+        conn.execute(f"""
+            CREATE TRIGGER trim_history AFTER INSERT ON history BEGIN
+                DELETE FROM history WHERE tab = NEW.tab AND id <= (
+                    SELECT id FROM history WHERE tab = NEW.tab
+                    ORDER BY id DESC LIMIT 1 OFFSET {int(MAX_PER_TAB)}
+                );
+            END
+        """)
 
 
 def add_entry(
@@ -51,16 +82,9 @@ def add_entry(
     with _connect() as conn:
         cursor = conn.execute(
             "INSERT INTO history (tab, created_at, title, thumbnail, image, data) VALUES (?,?,?,?,?,?)",
-            (tab, created_at, title, thumbnail, image, json.dumps(data)),
+            (tab, created_at, title, thumbnail, image, _dumps(data)),
         )
         entry_id = cursor.lastrowid
-        # Trim to MAX_PER_TAB oldest entries
-        conn.execute(
-            """DELETE FROM history WHERE tab = ? AND id NOT IN (
-                   SELECT id FROM history WHERE tab = ? ORDER BY id DESC LIMIT ?
-               )""",
-            (tab, tab, MAX_PER_TAB),
-        )
     return entry_id
 
 
@@ -86,7 +110,19 @@ def clear_tab(tab: str) -> int:
     return cur.rowcount
 
 
+def _dumps(data: dict) -> str:
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    return json.dumps(data)
+
+
+def _loads(text: str) -> dict:
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
 def _row_to_dict(row: sqlite3.Row) -> dict:
     d = dict(row)
-    d["data"] = json.loads(d["data"])
+    d["data"] = _loads(d["data"])
     return d
@@ -3,23 +3,32 @@
 from __future__ import annotations
 
 import re
+from html import escape
 
-from bs4 import BeautifulSoup, Tag
+from lxml import etree
+from lxml.html import HtmlElement, fragment_fromstring, tostring
 
 from parser import DocNode, NodeType
 
 
 def clean_html(html: str) -> str:
     """Clean Word's messy HTML into minimal, semantic HTML."""
-    soup = BeautifulSoup(html, "lxml")
-    body = soup.body or soup
+    return clean_tree(fragment_fromstring(html, create_parent="body"))
 
-    # Remove Word-specific style attributes and classes
-    for tag in body.find_all(True):
-        _clean_tag(tag)
 
-    # Get just the inner content (not <html><body> wrappers)
-    return body.decode_contents().strip()
+def clean_tree(body: HtmlElement) -> str:
+    """Clean an already-parsed HTML fragment in place and serialize its contents."""
+    # Drop inline CSS (Word inlines tons of it) and language tags across the
+    # whole tree in one C-level pass, then filter what's left per element.
+    etree.strip_attributes(body, "style", "lang", "xml:lang")
+    for tag in body.iterdescendants(etree.Element):
+        if tag.attrib:
+            _clean_tag(tag)
+
+    # Get just the inner content (not the <body> wrapper)
+    inner = escape(body.text or "", quote=False)
+    inner += "".join([tostring(child, encoding="unicode") for child in body])
+    return inner.strip()
 
 
 def node_to_html(node: DocNode) -> str:
@@ -55,35 +64,37 @@ def node_to_html(node: DocNode) -> str:
     return _escape_html(node.content)
 
 
-def _clean_tag(tag: Tag) -> None:
-    """Remove Word-specific attributes from an HTML tag."""
-    # Remove style attribute (Word inlines tons of CSS)
-    if tag.has_attr("style"):
-        del tag["style"]
+def _clean_tag(tag: HtmlElement) -> None:
+    """Remove Word-specific classes and data attributes from an HTML tag."""
+    attrib = tag.attrib
 
     # Remove Word-specific classes but keep semantic ones
-    if tag.has_attr("class"):
-        classes = tag["class"]
-        if isinstance(classes, str):
-            classes = classes.split()
+    classes = attrib.get("class")
+    if classes is not None:
         # Remove Mso* classes
-        cleaned = [c for c in classes if not c.startswith("Mso")]
+        cleaned = [c for c in classes.split() if not c.startswith("Mso")]
         if cleaned:
-            tag["class"] = cleaned
+            attrib["class"] = " ".join(cleaned)
         else:
-            del tag["class"]
+            del attrib["class"]
 
     # Remove other Word-specific attributes
-    for attr in list(tag.attrs.keys()):
-        if attr.startswith("data-") or attr in ("lang", "xml:lang"):
-            del tag[attr]
+    for attr in list(attrib.keys()):
+        if attr.startswith("data-"):
+            del attrib[attr]
+
+
+_HTML_ESCAPES = str.maketrans({
+    "&": "&amp;",
+    "<": "&lt;",
+    ">": "&gt;",
+    '"': "&quot;",
+})
+_HTML_SPECIAL_RE = re.compile(r'[&<>"]')
 
 
 def _escape_html(text: str) -> str:
     """Escape HTML special characters."""
-    return (
-        text.replace("&", "&amp;")
-        .replace("<", "&lt;")
-        .replace(">", "&gt;")
-        .replace('"', "&quot;")
-    )
+    if not _HTML_SPECIAL_RE.search(text):
+        return text
+    return text.translate(_HTML_ESCAPES)
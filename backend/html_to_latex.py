@@ -4,15 +4,21 @@ from __future__ import annotations
 
 import re
 
-from bs4 import BeautifulSoup, NavigableString, Tag
+from lxml.html import HtmlElement, fragment_fromstring
 
-from parser import DocNode, NodeType
+from parser import HEADING_RE, DocNode, NodeType
+
+_FENCE_OPEN_RE = re.compile(r'^```[^\n]*\n?')
+_FENCE_CLOSE_RE = re.compile(r'\n?```$')
 
 
 def html_to_latex(html: str) -> str:
     """Convert an HTML string with formatting to LaTeX."""
-    soup = BeautifulSoup(html, "lxml")
-    body = soup.body or soup
+    return tree_to_latex(fragment_fromstring(html, create_parent="body"))
+
+
+def tree_to_latex(body: HtmlElement) -> str:
+    """Convert an already-parsed HTML fragment to LaTeX (read-only)."""
     return _convert_element(body).strip()
 
 
@@ -23,8 +29,8 @@ def node_to_latex(node: DocNode) -> str:
             return html_to_latex(node.html)
         # Fenced code block stored as Markdown ``` syntax → verbatim in LaTeX
         if node.content.startswith("```"):
-            code = re.sub(r'^```[^\n]*\n?', '', node.content)
-            code = re.sub(r'\n?```$', '', code)
+            code = _FENCE_OPEN_RE.sub('', node.content)
+            code = _FENCE_CLOSE_RE.sub('', code)
             return f"\\begin{{verbatim}}\n{code}\n\\end{{verbatim}}"
         return _escape_latex(node.content)
 
@@ -69,48 +75,84 @@ def _heading_command(level: int) -> str:
     return commands.get(level, "section")
 
 
-def _convert_element(element: Tag | NavigableString) -> str:
-    """Recursively convert an HTML element to LaTeX."""
-    if isinstance(element, NavigableString):
-        return _escape_latex(str(element))
-
-    if not isinstance(element, Tag):
-        return ""
-
-    tag = element.name.lower() if element.name else ""
-    inner = "".join(_convert_element(c) for c in element.children)
-
-    if tag in ("b", "strong"):
-        return f"\\textbf{{{inner}}}"
-    if tag in ("i", "em"):
-        return f"\\textit{{{inner}}}"
-    if tag == "u":
-        return f"\\underline{{{inner}}}"
-    if tag == "sup":
-        return f"\\textsuperscript{{{inner}}}"
-    if tag == "sub":
-        return f"\\textsubscript{{{inner}}}"
-    if tag == "br":
-        return " \\\\\n"
-    if tag == "ul":
+# Tags that simply wrap their converted content: tag → (prefix, suffix)
+_LATEX_WRAP: dict[str, tuple[str, str]] = {
+    "b": ("\\textbf{", "}"),
+    "strong": ("\\textbf{", "}"),
+    "i": ("\\textit{", "}"),
+    "em": ("\\textit{", "}"),
+    "u": ("\\underline{", "}"),
+    "sup": ("\\textsuperscript{", "}"),
+    "sub": ("\\textsubscript{", "}"),
+    "br": (" \\\\\n", ""),
+    "li": ("", ""),
+    "p": ("", "\n\n"),
+}
+
+_LIST_ENVS = {"ul": "itemize", "ol": "enumerate"}
+
+
+def _convert_element(root: HtmlElement) -> str:
+    """Convert an HTML element (excluding its tail) to LaTeX.
+
+    Walks the subtree with an explicit stack instead of recursing, so deeply
+    nested Word markup costs no Python call per element and can't hit the
+    recursion limit.
+    """
+    leaf = _convert_leaf(root)
+    if leaf is not None:
+        return leaf
+
+    # Frames: (element, iterator over its children, converted inner parts)
+    stack = [(root, iter(root), _text_parts(root))]
+    while True:
+        element, children, parts = stack[-1]
+        child = next(children, None)
+        if child is not None:
+            converted = _convert_leaf(child)
+            if converted is None:
+                stack.append((child, iter(child), _text_parts(child)))
+                continue
+        else:
+            stack.pop()
+            converted = _wrap_element(element, "".join(parts))
+            if not stack:
+                return converted
+            child = element
+            parts = stack[-1][2]
+        parts.append(converted)
+        if child.tail:
+            parts.append(_escape_latex(child.tail))
+
+
+def _convert_leaf(element: HtmlElement) -> str | None:
+    """Convert elements whose children are not walked; None for everything else."""
+    if not isinstance(element.tag, str):
+        return ""  # comment or processing instruction
+
+    # lxml's HTML parser already lowercases tag names
+    env = _LIST_ENVS.get(element.tag)
+    if env:
         items = _collect_list_items(element)
         item_strs = [f"  \\item {item}" for item in items]
-        return f"\\begin{{itemize}}\n" + "\n".join(item_strs) + "\n\\end{itemize}"
-    if tag == "ol":
-        items = _collect_list_items(element)
-        item_strs = [f"  \\item {item}" for item in items]
-        return f"\\begin{{enumerate}}\n" + "\n".join(item_strs) + "\n\\end{enumerate}"
-    if tag == "li":
-        return inner
-    if tag == "p":
-        return inner + "\n\n"
+        return f"\\begin{{{env}}}\n" + "\n".join(item_strs) + f"\n\\end{{{env}}}"
+    return None
+
+
+def _text_parts(element: HtmlElement) -> list[str]:
+    return [_escape_latex(element.text)] if element.text else []
+
+
+def _wrap_element(element: HtmlElement, inner: str) -> str:
+    """Apply an element's own formatting around its converted content."""
+    wrap = _LATEX_WRAP.get(element.tag)
+    if wrap:
+        return wrap[0] + inner + wrap[1]
 
     # Check for Word heading class
-    cls = element.get("class", [])
-    if isinstance(cls, str):
-        cls = cls.split()
-    for c in cls:
-        m = re.match(r"MsoHeading(\d)", c, re.IGNORECASE)
+    cls = element.get("class")
+    for c in cls.split() if cls else ():
+        m = HEADING_RE.match(c)
         if m:
             level = int(m.group(1))
             cmd = _heading_command(level)
@@ -119,29 +161,36 @@ def _convert_element(element: Tag | NavigableString) -> str:
     return inner
 
 
-def _collect_list_items(list_tag: Tag) -> list[str]:
+def _collect_list_items(list_tag: HtmlElement) -> list[str]:
     """Collect list item contents from a <ul> or <ol>."""
     items = []
-    for child in list_tag.children:
-        if isinstance(child, Tag) and child.name and child.name.lower() == "li":
+    for child in list_tag:
+        if child.tag == "li":
             items.append(_convert_element(child).strip())
     return items
 
 
+# Single-pass translation table for LaTeX special characters. str.translate
+# maps each original character independently, so the backslash escape can't
+# be re-escaped by the later brace rules.
+_LATEX_ESCAPES = str.maketrans({
+    "\\": "\\textbackslash{}",
+    "&": "\\&",
+    "%": "\\%",
+    "$": "\\$",
+    "#": "\\#",
+    "_": "\\_",
+    "{": "\\{",
+    "}": "\\}",
+    "~": "\\textasciitilde{}",
+    "^": "\\textasciicircum{}",
+})
+_LATEX_SPECIAL_RE = re.compile(r'[\\&%$#_{}~^]')
+
+
 def _escape_latex(text: str) -> str:
     """Escape special LaTeX characters in plain text."""
-    replacements = [
-        ("\\", "\\textbackslash{}"),
-        ("&", "\\&"),
-        ("%", "\\%"),
-        ("$", "\\$"),
-        ("#", "\\#"),
-        ("_", "\\_"),
-        ("{", "\\{"),
-        ("}", "\\}"),
-        ("~", "\\textasciitilde{}"),
-        ("^", "\\textasciicircum{}"),
-    ]
-    for old, new in replacements:
-        text = text.replace(old, new)
-    return text
+    # Most prose has none of these; skip building a translated copy.
+    if not _LATEX_SPECIAL_RE.search(text):
+        return text
+    return text.translate(_LATEX_ESCAPES)
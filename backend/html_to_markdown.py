@@ -4,15 +4,20 @@ from __future__ import annotations
 
 import re
 
-from bs4 import BeautifulSoup, NavigableString, Tag
+from lxml.html import HtmlElement, fragment_fromstring
 
-from parser import DocNode, NodeType
+from parser import HEADING_RE, DocNode, NodeType
+
+_WS_RE = re.compile(r'\s+')
 
 
 def html_to_markdown(html: str) -> str:
     """Convert an HTML string to Markdown."""
-    soup = BeautifulSoup(html, "lxml")
-    body = soup.body or soup
+    return tree_to_markdown(fragment_fromstring(html, create_parent="body"))
+
+
+def tree_to_markdown(body: HtmlElement) -> str:
+    """Convert an already-parsed HTML fragment to Markdown (read-only)."""
     return _convert_element(body).strip()
 
 
@@ -49,48 +54,91 @@ def node_to_markdown(node: DocNode) -> str:
     return node.content
 
 
-def _convert_element(element: Tag | NavigableString) -> str:
-    """Recursively convert an HTML element to Markdown."""
-    if isinstance(element, NavigableString):
-        s = str(element)
-        # Collapse internal whitespace (newlines from HTML source) to preserve paragraph
-        return re.sub(r'\s+', ' ', s) if s.strip() else s
-
-    if not isinstance(element, Tag):
-        return ""
-
-    tag = element.name.lower() if element.name else ""
-    inner = "".join(_convert_element(c) for c in element.children)
-
-    if tag in ("b", "strong"):
-        return f"**{inner}**"
-    if tag in ("i", "em"):
-        return f"*{inner}*"
-    if tag == "u":
-        return f"<u>{inner}</u>"
-    if tag == "sup":
-        return f"<sup>{inner}</sup>"
-    if tag == "sub":
-        return f"<sub>{inner}</sub>"
-    if tag == "br":
-        return "\n"
+def _convert_text(s: str) -> str:
+    """Convert an element's text or tail to Markdown."""
+    # Collapse internal whitespace (newlines from HTML source) to preserve paragraph
+    return _WS_RE.sub(' ', s) if s.strip() else s
+
+
+# Tags that simply wrap their converted content: tag → (prefix, suffix)
+_MD_WRAP: dict[str, tuple[str, str]] = {
+    "b": ("**", "**"),
+    "strong": ("**", "**"),
+    "i": ("*", "*"),
+    "em": ("*", "*"),
+    "u": ("<u>", "</u>"),
+    "sup": ("<sup>", "</sup>"),
+    "sub": ("<sub>", "</sub>"),
+    "br": ("\n", ""),
+    "p": ("", "\n\n"),
+}
+
+
+def _convert_element(root: HtmlElement) -> str:
+    """Convert an HTML element (excluding its tail) to Markdown.
+
+    Walks the subtree with an explicit stack instead of recursing; see
+    html_to_latex._convert_element.
+    """
+    leaf = _convert_leaf(root)
+    if leaf is not None:
+        return leaf
+
+    # Frames: (element, iterator over its children, converted inner parts)
+    stack = [(root, iter(root), _text_parts(root))]
+    while True:
+        element, children, parts = stack[-1]
+        child = next(children, None)
+        if child is not None:
+            converted = _convert_leaf(child)
+            if converted is None:
+                stack.append((child, iter(child), _text_parts(child)))
+                continue
+        else:
+            stack.pop()
+            converted = _wrap_element(element, "".join(parts))
+            if not stack:
+                return converted
+            child = element
+            parts = stack[-1][2]
+        parts.append(converted)
+        if child.tail:
+            parts.append(_convert_text(child.tail))
+
+
+def _convert_leaf(element: HtmlElement) -> str | None:
+    """Convert elements whose children are not walked; None for everything else."""
+    if not isinstance(element.tag, str):
+        return ""  # comment or processing instruction
+
+    # lxml's HTML parser already lowercases tag names
+    tag = element.tag
     if tag == "ul":
         items = _collect_list_items(element)
-        return "\n".join(f"- {item}" for item in items)
+        return "\n".join([f"- {item}" for item in items])
     if tag == "ol":
         items = _collect_list_items(element)
-        return "\n".join(f"{i + 1}. {item}" for i, item in enumerate(items))
+        return "\n".join([f"{i + 1}. {item}" for i, item in enumerate(items)])
+    return None
+
+
+def _text_parts(element: HtmlElement) -> list[str]:
+    return [_convert_text(element.text)] if element.text else []
+
+
+def _wrap_element(element: HtmlElement, inner: str) -> str:
+    """Apply an element's own formatting around its converted content."""
+    tag = element.tag
+    wrap = _MD_WRAP.get(tag)
+    if wrap:
+        return wrap[0] + inner + wrap[1]
     if tag == "li":
         return inner.strip()
-    if tag == "p":
-        return inner + "\n\n"
 
     # Word heading classes
-    cls = element.get("class", [])
-    if isinstance(cls, str):
-        cls = cls.split()
-    for c in cls:
-        m = re.match(r"MsoHeading(\d)", c, re.IGNORECASE)
+    cls = element.get("class")
+    for c in cls.split() if cls else ():
+        m = HEADING_RE.match(c)
         if m:
             level = int(m.group(1))
             prefix = "#" * level
@@ -99,10 +147,10 @@ def _convert_element(element: Tag | NavigableString) -> str:
     return inner
 
 
-def _collect_list_items(list_tag: Tag) -> list[str]:
+def _collect_list_items(list_tag: HtmlElement) -> list[str]:
     """Collect list item text from a <ul> or <ol>."""
     items = []
-    for child in list_tag.children:
-        if isinstance(child, Tag) and child.name and child.name.lower() == "li":
+    for child in list_tag:
+        if child.tag == "li":
             items.append(_convert_element(child).strip())
     return items
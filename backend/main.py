@@ -2,27 +2,83 @@
 
 import asyncio
 import json
+import os
 import shutil
 import subprocess
-import tempfile
+import sys
+from contextlib import asynccontextmanager
+from enum import Enum
+from functools import lru_cache
 from pathlib import Path
-from queue import Empty, Queue
-from threading import Thread
+from typing import Literal
 
-from fastapi import FastAPI, File, Form, UploadFile
+try:
+    import orjson
+except ImportError:  # optional C-accelerated JSON; stdlib json is the fallback
+    orjson = None
+
+from fastapi import FastAPI, File, Form, Request, UploadFile
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from pydantic import BaseModel, ConfigDict, Field
+
+import pandoc_server
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Probe Pandoc and open the databases, then optionally warm local OCR models.
 
-from clipboard import read_clipboard_debug
-from converter import convert_clipboard, convert_html
-from to_clipboard import convert_to_clipboard
-from history import init_db
-from settings import init_settings, get_all, set_many
+    Converter, clipboard and OCR modules are imported by the endpoints that use
+    them, so startup (and ``--reload``) doesn't pay for them.  ``ocr_service``
+    is only imported here when ``PRELOAD_OCR_MODELS`` names models to warm.
+    """
+    from dotenv import load_dotenv
+    from history import init_db
+    from settings import init_settings
+    # Fill the Pandoc probe cache while startup continues, so the first
+    # /api/health or export doesn't wait on `pandoc --version`.
+    pandoc_probe = asyncio.create_task(asyncio.to_thread(_pandoc_info))
+    await asyncio.to_thread(init_db)
+    await asyncio.to_thread(init_settings)
+
+    load_dotenv()  # PRELOAD_OCR_MODELS may be set in .env
+
+    names = [n.strip().lower() for n in os.environ.get("PRELOAD_OCR_MODELS", "").split(",") if n.strip()]
+    preload = None
+    if names:
+        import ocr_service
+        preload = asyncio.create_task(asyncio.to_thread(ocr_service.preload_models, names))
+    yield
+    for task in (pandoc_probe, preload):
+        if task is not None and not task.done():
+            task.cancel()
+    # Only an OCR endpoint or preload imports ocr_service; nothing to close otherwise
+    if "ocr_service" in sys.modules:
+        sys.modules["ocr_service"].close_http_client()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when it is installed.
+
+    History lists carry base64 thumbnails/images, where encoder speed shows.
+    (FastAPI's own ORJSONResponse is deprecated in newer releases.)
+    """
 
-app = FastAPI(title="Word2LaTeX", version="1.0.0")
-init_db()
-init_settings()
+    def render(self, content) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+app = FastAPI(
+    title="Word2LaTeX",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -32,21 +88,83 @@ app.add_middleware(
 )
 
 
-@app.get("/api/health")
-def health():
-    """Health check — also reports Pandoc availability."""
+@app.exception_handler(RequestValidationError)
+async def validation_error(request: Request, exc: RequestValidationError):
+    """Report invalid requests in the ``{"error": ...}`` shape the frontend reads."""
+    messages = [f"{e['loc'][-1]}: {e['msg']}" for e in exc.errors()]
+    return JSONResponse(
+        status_code=400,
+        content={"error": "; ".join(messages), "warnings": messages},
+    )
+
+
+# ── Request bodies ────────────────────────────────────────────────────────────
+
+class HistoryTab(str, Enum):
+    """History tabs the frontend panels write to; anything else is rejected at routing."""
+    clipboard = "clipboard"
+    ocr = "ocr"
+    pdf = "pdf"
+    word = "word"
+
+
+DocFormat = Literal["markdown", "latex"]
+
+
+class DocumentBody(BaseModel):
+    model_config = ConfigDict(str_strip_whitespace=True)
+
+    text: str = Field(min_length=1)
+    format: DocFormat = "markdown"
+
+
+class HtmlBody(BaseModel):
+    html: str = Field(min_length=1)
+
+
+class TranslateBody(BaseModel):
+    model_config = ConfigDict(str_strip_whitespace=True)
+
+    text: str = Field(min_length=1)
+    target_language: str = "English"
+    format: str = "markdown"
+
+
+class HistoryBody(BaseModel):
+    tab: HistoryTab
+    title: str = "Untitled"
+    data: dict = Field(default_factory=dict)
+    thumbnail: str | None = None
+    image: str | None = None
+
+
+@lru_cache(maxsize=1)
+def _pandoc_info() -> tuple[str | None, str | None]:
+    """Locate Pandoc and read its version once; neither changes per request."""
     pandoc_path = shutil.which("pandoc")
     pandoc_version = None
     if pandoc_path:
         try:
             result = subprocess.run(
-                ["pandoc", "--version"],
-                capture_output=True, text=True, timeout=5,
+                [pandoc_path, "--version"],
+                capture_output=True, timeout=5,
             )
-            first_line = result.stdout.splitlines()[0] if result.stdout else ""
-            pandoc_version = first_line
+            stdout = result.stdout.decode("utf-8", errors="replace")
+            pandoc_version = stdout.splitlines()[0] if stdout else ""
         except Exception:
             pass
+    return pandoc_path, pandoc_version
+
+
+@app.get("/api/health")
+async def health(refresh: bool = False):
+    """Health check — also reports Pandoc availability.
+
+    The Pandoc probe is cached; pass ``?refresh=true`` to re-run it.
+    """
+    if refresh:
+        _pandoc_info.cache_clear()
+    pandoc_path, pandoc_version = await asyncio.to_thread(_pandoc_info)
     return {
         "status": "ok",
         "pandoc_installed": pandoc_path is not None,
@@ -57,6 +175,7 @@ def health():
 @app.get("/api/clipboard-info")
 def clipboard_info():
     """Return debug info about clipboard contents: available formats and raw HTML."""
+    from clipboard import read_clipboard_debug
     try:
         return read_clipboard_debug()
     except Exception as e:
@@ -66,11 +185,25 @@ def clipboard_info():
         )
 
 
+@app.get("/api/clipboard-status")
+def clipboard_status():
+    """Cheap check for whether the clipboard holds HTML (no format enumeration)."""
+    from clipboard import clipboard_has_html
+    try:
+        return {"has_html": clipboard_has_html()}
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={"error": str(e)},
+        )
+
+
 @app.get("/api/convert")
-def convert():
+async def convert():
     """Read the Windows clipboard and convert to LaTeX/Markdown/HTML."""
+    from converter import convert_clipboard
     try:
-        result = convert_clipboard()
+        result = await asyncio.to_thread(convert_clipboard)
         return result
     except Exception as e:
         return JSONResponse(
@@ -80,20 +213,11 @@ def convert():
 
 
 @app.post("/api/to-clipboard")
-def to_clipboard(body: dict):
-    """Convert Markdown or LaTeX text and write it to the Windows clipboard.
-
-    Body: ``{"text": "...", "format": "markdown" | "latex"}``
-    """
-    text = body.get("text", "").strip()
-    fmt = body.get("format", "markdown")
-    if not text:
-        return JSONResponse(
-            status_code=400,
-            content={"error": "No text provided", "warnings": ["No text provided"]},
-        )
+async def to_clipboard(body: DocumentBody):
+    """Convert Markdown or LaTeX text and write it to the Windows clipboard."""
+    from to_clipboard import convert_to_clipboard
     try:
-        result = convert_to_clipboard(text, fmt)
+        result = await asyncio.to_thread(convert_to_clipboard, body.text, body.format)
         return result
     except ValueError as e:
         return JSONResponse(status_code=400, content={"error": str(e)})
@@ -102,16 +226,11 @@ def to_clipboard(body: dict):
 
 
 @app.post("/api/convert/text")
-def convert_text(body: dict):
+async def convert_text(body: HtmlBody):
     """Accept raw HTML+OMML and convert (useful for testing without clipboard)."""
-    html = body.get("html", "")
-    if not html:
-        return JSONResponse(
-            status_code=400,
-            content={"error": "No HTML provided", "warnings": ["No HTML provided"]},
-        )
+    from converter import convert_html
     try:
-        result = convert_html(html)
+        result = await asyncio.to_thread(convert_html, body.html)
         return result
     except Exception as e:
         return JSONResponse(
@@ -123,25 +242,23 @@ def convert_text(body: dict):
 @app.post("/api/ocr")
 async def ocr_image(
     image: UploadFile = File(...),
-    backend: str = Form("gemini"),
-    format: str = Form("markdown"),
-    stream: str = Form("false"),
+    backend: Literal["gemini", "ollama", "lmstudio", "got", "texify"] = Form("gemini"),
+    format: Literal["latex", "markdown", "text"] = Form("markdown"),
+    stream: bool = Form(False),
 ):
     """OCR an uploaded image using Gemini API or GOT-OCR 2.0.
     When stream=true, returns Server-Sent Events with progress logs."""
-    if format not in ("latex", "markdown", "text"):
-        return JSONResponse(status_code=400, content={"error": f"Invalid format: {format!r}"})
-    if backend not in ("gemini", "ollama", "lmstudio", "got", "texify"):
-        return JSONResponse(status_code=400, content={"error": f"Invalid backend: {backend!r}"})
 
-    use_stream = stream.lower() in ("true", "1", "yes")
     image_bytes = await image.read()
+    # Every backend needs contiguous bytes, so drop Starlette's spooled copy
+    # now rather than holding both for the whole OCR run.
+    await image.close()
     mime_type = image.content_type or "image/png"
 
-    if not use_stream:
+    if not stream:
         try:
             from ocr_service import run_ocr
-            result = run_ocr(image_bytes, mime_type, backend, format)
+            result = await asyncio.to_thread(run_ocr, image_bytes, mime_type, backend, format)
             return {"result": result, "backend": backend}
         except Exception as e:
             import traceback
@@ -149,49 +266,37 @@ async def ocr_image(
             print(detail)
             return JSONResponse(status_code=500, content={"error": str(e), "detail": detail})
 
-    # Streaming mode: run OCR in thread, stream logs via SSE
-    queue: Queue = Queue()
+    # Streaming mode: run OCR in a worker thread, stream logs via SSE.
+    # The thread hands events to the event loop through an asyncio.Queue, so
+    # the generator wakes as soon as each one arrives instead of polling.
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
 
     def log_cb(entry: dict) -> None:
-        queue.put(("log", entry))
+        loop.call_soon_threadsafe(queue.put_nowait, ("log", entry))
 
-    def run_ocr_thread() -> None:
+    def run_ocr_blocking() -> str:
+        log_cb({"step": "start", "msg": f"Request received ({len(image_bytes)} bytes), starting {backend}...", "elapsed_ms": 0})
+        from ocr_service import run_ocr
+        return run_ocr(image_bytes, mime_type, backend, format, on_log=log_cb)
+
+    async def run_ocr_task() -> None:
         try:
-            log_cb({"step": "start", "msg": f"Request received ({len(image_bytes)} bytes), starting {backend}...", "elapsed_ms": 0})
-            from ocr_service import run_ocr
-            result = run_ocr(image_bytes, mime_type, backend, format, on_log=log_cb)
-            queue.put(("result", {"result": result, "backend": backend}))
+            result = await asyncio.to_thread(run_ocr_blocking)
+            queue.put_nowait(("result", {"result": result, "backend": backend}))
         except Exception as e:
             import traceback
-            queue.put(("error", {"error": str(e), "detail": traceback.format_exc()}))
-        finally:
-            queue.put((None, None))
+            queue.put_nowait(("error", {"error": str(e), "detail": traceback.format_exc()}))
 
-    thread = Thread(target=run_ocr_thread)
-    thread.start()
-
-    def get_from_queue():
-        try:
-            return queue.get(timeout=0.2)
-        except Empty:
-            return ("_timeout", None)
+    task = asyncio.create_task(run_ocr_task())
 
     async def event_generator():
-        loop = asyncio.get_event_loop()
         while True:
-            kind, data = await loop.run_in_executor(None, get_from_queue)
-            if kind == "_timeout":
-                continue
-            if kind is None:
-                break
-            if kind == "log":
-                yield f"event: log\ndata: {json.dumps(data)}\n\n"
-            elif kind == "result":
-                yield f"event: result\ndata: {json.dumps(data)}\n\n"
-                break
-            elif kind == "error":
-                yield f"event: error\ndata: {json.dumps(data)}\n\n"
+            kind, data = await queue.get()
+            yield _sse_event(kind, data)
+            if kind != "log":
                 break
+        await task
 
     return StreamingResponse(
         event_generator(),
@@ -200,51 +305,58 @@ async def ocr_image(
     )
 
 
+def _sse_event(kind: str, data: dict) -> bytes:
+    """Frame one Server-Sent Event as bytes, so Starlette needn't re-encode it."""
+    if orjson is not None:
+        payload = orjson.dumps(data)
+    else:
+        payload = json.dumps(data).encode("utf-8")
+    return b"event: " + kind.encode("ascii") + b"\ndata: " + payload + b"\n\n"
+
+
 @app.post("/api/translate")
-def translate(body: dict):
+async def translate(body: TranslateBody):
     """Translate OCR'd text to a target language via Gemini, preserving math/formatting."""
-    text = body.get("text", "").strip()
-    target_language = body.get("target_language", "English")
-    fmt = body.get("format", "markdown")
-    if not text:
-        return JSONResponse(status_code=400, content={"error": "No text provided"})
     try:
         from ocr_service import translate_text
-        result = translate_text(text, target_language, fmt)
+        result = await asyncio.to_thread(translate_text, body.text, body.target_language, body.format)
         return {"result": result}
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 
 @app.post("/api/export/docx")
-def export_docx(body: dict):
+async def export_docx(body: DocumentBody):
     """Convert Markdown or LaTeX to a .docx file via Pandoc and return it for download."""
-    text = body.get("text", "").strip()
-    fmt = body.get("format", "markdown")
-    if not text:
-        return JSONResponse(status_code=400, content={"error": "No text provided"})
-    if fmt not in ("markdown", "latex"):
-        return JSONResponse(status_code=400, content={"error": f"Invalid format: {fmt!r}"})
-    if not shutil.which("pandoc"):
+    text, fmt = body.text, body.format
+    pandoc_path, _ = await asyncio.to_thread(_pandoc_info)
+    if pandoc_path is None:
         return JSONResponse(status_code=500, content={"error": "Pandoc is not installed"})
 
-    with tempfile.NamedTemporaryFile(suffix=".docx", delete=False) as tmp:
-        tmp_path = Path(tmp.name)
-
     try:
-        result = subprocess.run(
-            ["pandoc", "-f", fmt, "-t", "docx", "-o", str(tmp_path)],
-            input=text.encode("utf-8"),
-            capture_output=True,
-            timeout=30,
-        )
-        if result.returncode != 0:
-            stderr = result.stderr.decode("utf-8", errors="replace")
-            return JSONResponse(status_code=500, content={"error": stderr or "Pandoc failed"})
-        docx_bytes = tmp_path.read_bytes()
-    finally:
-        tmp_path.unlink(missing_ok=True)
+        docx_bytes = await asyncio.to_thread(pandoc_server.convert, text, fmt, "docx", pandoc_path, standalone=True)
+    except RuntimeError as e:
+        return JSONResponse(status_code=500, content={"error": str(e) or "Pandoc failed"})
+    if docx_bytes is not None:
+        return _docx_response(docx_bytes)
+
+    # Fallback: one-shot CLI writing the .docx to stdout (no temp file round trip).
+    result = await asyncio.to_thread(
+        subprocess.run,
+        [pandoc_path, "-f", fmt, "-t", "docx", "-o", "-"],
+        input=text.encode("utf-8"),
+        capture_output=True,
+        timeout=30,
+    )
+    if result.returncode != 0:
+        stderr = result.stderr.decode("utf-8", errors="replace")
+        return JSONResponse(status_code=500, content={"error": stderr or "Pandoc failed"})
+    docx_bytes = result.stdout
+
+    return _docx_response(docx_bytes)
+
 
+def _docx_response(docx_bytes: bytes) -> Response:
     return Response(
         content=docx_bytes,
         media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
@@ -255,33 +367,28 @@ def export_docx(body: dict):
 @app.get("/api/settings")
 def get_settings():
     """Return all app settings (stored in DB)."""
+    from settings import get_all
     return get_all()
 
 
 @app.put("/api/settings")
 def update_settings(body: dict):
     """Update settings. Body: {key: value, ...}. Only known keys are stored."""
+    from settings import set_many
     set_many(body)
     return {"ok": True}
 
 
 @app.get("/api/history/{tab}")
-def get_history(tab: str, limit: int = 50):
+def get_history(tab: HistoryTab, limit: int = 50):
     from history import get_entries
-    return {"items": get_entries(tab, limit)}
+    return {"items": get_entries(tab.value, limit)}
 
 
 @app.post("/api/history")
-def add_history(body: dict):
-    tab       = body.get("tab", "").strip()
-    title     = body.get("title", "Untitled")
-    data      = body.get("data", {})
-    thumbnail = body.get("thumbnail")
-    image     = body.get("image")
-    if not tab:
-        return JSONResponse(status_code=400, content={"error": "tab required"})
+def add_history(body: HistoryBody):
     from history import add_entry
-    entry_id = add_entry(tab, title, data, thumbnail, image)
+    entry_id = add_entry(body.tab.value, body.title, body.data, body.thumbnail, body.image)
     return {"id": entry_id}
 
 
@@ -292,9 +399,9 @@ def delete_history_item(entry_id: int):
 
 
 @app.delete("/api/history/tab/{tab}")
-def clear_history(tab: str):
+def clear_history(tab: HistoryTab):
     from history import clear_tab
-    return {"cleared": clear_tab(tab)}
+    return {"cleared": clear_tab(tab.value)}
 
 
 # Serve frontend static files in production
@@ -0,0 +1,55 @@
+"""Bounded OMML → postprocessed LaTeX cache shared by the converter and parser."""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable
+
+from omml_to_latex import try_omml_to_latex
+from postprocess import postprocess_latex
+
+# Keyed on the raw XML string and bounded LRU.  Word clipboards often repeat
+# the same formula (inline symbols, re-pasted selections), so each unique
+# fragment only goes through Pandoc once.  An explicit dict (rather than
+# lru_cache) lets the converter fill it from one batched Pandoc run.
+# Pandoc failures are never stored: their plain-text fallback is returned
+# but the equation is converted again next time.
+_MATH_CACHE_SIZE = 512
+_math_cache: OrderedDict[str, str] = OrderedDict()
+_math_cache_lock = threading.Lock()
+
+
+def remember_math(omml_xml: str, latex: str) -> None:
+    """Store postprocessed *latex* for *omml_xml*."""
+    with _math_cache_lock:
+        _math_cache[omml_xml] = latex
+        _math_cache.move_to_end(omml_xml)
+        if len(_math_cache) > _MATH_CACHE_SIZE:
+            _math_cache.popitem(last=False)
+
+
+def cached_math(omml_xml: str) -> str:
+    """Convert OMML to postprocessed LaTeX, memoized on the raw XML string."""
+    with _math_cache_lock:
+        latex = _math_cache.get(omml_xml)
+        if latex is not None:
+            _math_cache.move_to_end(omml_xml)
+            return latex
+    latex, converted = try_omml_to_latex(omml_xml)
+    latex = postprocess_latex(latex)
+    if converted:
+        remember_math(omml_xml, latex)
+    return latex
+
+
+def uncached_math(xmls: Iterable[str]) -> list[str]:
+    """Return the distinct entries of *xmls* not yet in the cache, in order."""
+    with _math_cache_lock:
+        return list(dict.fromkeys(xml for xml in xmls if xml not in _math_cache))
+
+
+def clear_math_cache() -> None:
+    """Drop all memoized OMML → LaTeX conversions."""
+    with _math_cache_lock:
+        _math_cache.clear()
@@ -6,16 +6,22 @@ import base64
 import json
 import os
 import tempfile
+import threading
 import time
-import urllib.request
-import urllib.error
 import warnings
+from concurrent.futures import Future
+from functools import lru_cache
 from pathlib import Path
 from typing import Callable
 
 from dotenv import load_dotenv
 load_dotenv()
 
+try:
+    import orjson
+except ImportError:  # optional C-accelerated JSON; stdlib json is the fallback
+    orjson = None
+
 # Suppress noisy but harmless warnings from GOT-OCR's internal code
 warnings.filterwarnings("ignore", category=SyntaxWarning)
 warnings.filterwarnings("ignore", message=".*attention mask.*", category=UserWarning)
@@ -79,6 +85,33 @@ def ocr_gemini(image_bytes: bytes, mime_type: str, fmt: str, on_log: Callable[[d
 # Ollama backend (local or remote API)
 # ---------------------------------------------------------------------------
 
+@lru_cache(maxsize=1)
+def _http_client():
+    """Shared keep-alive connection pool for the local model servers (Ollama, LM Studio)."""
+    import httpx
+    return httpx.Client(limits=httpx.Limits(max_connections=32, max_keepalive_connections=16))
+
+
+def close_http_client() -> None:
+    """Close the shared pool if it was ever opened (called on app shutdown)."""
+    if _http_client.cache_info().currsize:
+        _http_client().close()
+        _http_client.cache_clear()
+
+
+def _post_json(url: str, payload: dict, timeout: float):
+    """POST *payload* as JSON; orjson serializes the large base64 image string in C."""
+    import httpx
+    body = orjson.dumps(payload) if orjson is not None else json.dumps(payload).encode("utf-8")
+    return _http_client().post(
+        url,
+        content=body,
+        headers={"Content-Type": "application/json"},
+        # Inference may take minutes, but an unreachable host should fail fast.
+        timeout=httpx.Timeout(timeout, connect=5.0),
+    )
+
+
 def ocr_ollama(image_bytes: bytes, mime_type: str, fmt: str, on_log: Callable[[dict], None] | None = None) -> str:
     """OCR via Ollama vision API. Uses base_url and model from settings."""
     from settings import get_all
@@ -101,24 +134,18 @@ def ocr_ollama(image_bytes: bytes, mime_type: str, fmt: str, on_log: Callable[[d
         "stream": False,
     }
 
-    req = urllib.request.Request(
-        f"{base_url}/api/chat",
-        data=json.dumps(payload).encode("utf-8"),
-        headers={"Content-Type": "application/json"},
-        method="POST",
-    )
-
+    import httpx
     try:
-        with urllib.request.urlopen(req, timeout=120) as resp:
-            data = json.loads(resp.read().decode())
-    except urllib.error.URLError as e:
+        resp = _post_json(f"{base_url}/api/chat", payload, timeout=120)
+        resp.raise_for_status()
+        data = resp.json()
+    except httpx.HTTPStatusError as e:
+        raise RuntimeError(f"Ollama API error {e.response.status_code}: {e.response.text}") from e
+    except httpx.TransportError as e:
         raise RuntimeError(
-            f"Ollama connection failed: {e.reason}. "
+            f"Ollama connection failed: {e}. "
             f"Ensure Ollama is running at {base_url} and model '{model}' is pulled (ollama pull {model})."
         ) from e
-    except urllib.error.HTTPError as e:
-        body = e.read().decode() if e.fp else ""
-        raise RuntimeError(f"Ollama API error {e.code}: {body}") from e
 
     if on_log:
         on_log({"step": "ollama_done", "msg": "Ollama API completed", "elapsed_ms": round((time.perf_counter() - t0) * 1000)})
@@ -163,24 +190,18 @@ def ocr_lmstudio(image_bytes: bytes, mime_type: str, fmt: str, on_log: Callable[
         "stream": False,
     }
 
-    req = urllib.request.Request(
-        f"{base_url}/chat/completions",
-        data=json.dumps(payload).encode("utf-8"),
-        headers={"Content-Type": "application/json"},
-        method="POST",
-    )
-
+    import httpx
     try:
-        with urllib.request.urlopen(req, timeout=180) as resp:
-            data = json.loads(resp.read().decode())
-    except urllib.error.URLError as e:
+        resp = _post_json(f"{base_url}/chat/completions", payload, timeout=180)
+        resp.raise_for_status()
+        data = resp.json()
+    except httpx.HTTPStatusError as e:
+        raise RuntimeError(f"LM Studio API error {e.response.status_code}: {e.response.text}") from e
+    except httpx.TransportError as e:
         raise RuntimeError(
-            f"LM Studio connection failed: {e.reason}. "
+            f"LM Studio connection failed: {e}. "
             f"Ensure LM Studio is running at {base_url} with a vision model loaded."
         ) from e
-    except urllib.error.HTTPError as e:
-        body = e.read().decode() if e.fp else ""
-        raise RuntimeError(f"LM Studio API error {e.code}: {body}") from e
 
     if on_log:
         on_log({"step": "lmstudio_done", "msg": "LM Studio API completed", "elapsed_ms": round((time.perf_counter() - t0) * 1000)})
@@ -201,10 +222,23 @@ def ocr_lmstudio(image_bytes: bytes, mime_type: str, fmt: str, on_log: Callable[
 
 _got_model = None
 _got_tokenizer = None
+# GOT's chat() only accepts an image path; on Linux keep that file in tmpfs.
+_RAM_TMP_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+_got_lock = threading.Lock()
+
+
+_dynamic_cache_patched = False
 
 
 def _patch_dynamic_cache() -> None:
-    """GOT-OCR 2.0 uses DynamicCache.seen_tokens which was renamed in transformers >= 4.40."""
+    """GOT-OCR 2.0 uses DynamicCache.seen_tokens which was renamed in transformers >= 4.40.
+
+    Applied once per process; wrapping again would nest another __init__ layer
+    that every cache construction during generation has to go through.
+    """
+    global _dynamic_cache_patched
+    if _dynamic_cache_patched:
+        return
     try:
         from transformers.cache_utils import DynamicCache
         original_init = DynamicCache.__init__
@@ -216,11 +250,21 @@ def _patch_dynamic_cache() -> None:
                 self.seen_tokens = 0
 
         DynamicCache.__init__ = patched_init
+        _dynamic_cache_patched = True
     except Exception:
         pass
 
 
 def _load_got():
+    if _got_model is not None:
+        return _got_model, _got_tokenizer
+    # Serialize loads so a request arriving during startup preload waits for it
+    # instead of loading a second copy.
+    with _got_lock:
+        return _load_got_locked()
+
+
+def _load_got_locked():
     global _got_model, _got_tokenizer
     if _got_model is not None:
         return _got_model, _got_tokenizer
@@ -241,8 +285,14 @@ def _load_got():
     device_map = "cuda" if torch.cuda.is_available() else "cpu"
     if device_map == "cuda":
         print(f"CUDA available ({torch.cuda.device_count()} device(s)), using GPU for GOT-OCR")
+        # Half-precision weights halve memory traffic; GOT's chat() already
+        # autocasts to bf16 on CUDA. Remaining fp32 matmuls may use TF32.
+        dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+        torch.backends.cuda.matmul.allow_tf32 = True
+        torch.set_float32_matmul_precision("high")
     else:
         print("CUDA not available, using CPU for GOT-OCR. This may be slower.")
+        dtype = torch.float32
 
     model_id = "ucaslcl/GOT-OCR2_0"
     tokenizer = AutoTokenizer.from_pretrained(model_id, trust_remote_code=True)
@@ -251,19 +301,21 @@ def _load_got():
         trust_remote_code=True,
         low_cpu_mem_usage=True,
         device_map=device_map,
+        torch_dtype=dtype,
         use_safetensors=True,
         pad_token_id=tokenizer.eos_token_id,
     ).eval()
 
-    _got_model = model
+    # Publish the tokenizer first: _load_got's unlocked fast path only checks
+    # the model.
     _got_tokenizer = tokenizer
+    _got_model = model
     return model, tokenizer
 
 
 def ocr_got(image_bytes: bytes, fmt: str, on_log: Callable[[dict], None] | None = None) -> str:
     import traceback
     ocr_type = "ocr" if fmt == "text" else "format"
-    _patch_dynamic_cache()  # re-apply each call in case model was already cached
 
     if on_log:
         on_log({"step": "got_load", "msg": "Loading GOT-OCR model (first run may download ~2GB)...", "elapsed_ms": 0})
@@ -275,7 +327,7 @@ def ocr_got(image_bytes: bytes, fmt: str, on_log: Callable[[dict], None] | None
     # Write to temp file, flush and close before GOT-OCR opens it (required on Windows)
     if on_log:
         on_log({"step": "got_temp", "msg": "Writing temp file...", "elapsed_ms": round((time.perf_counter() - t0) * 1000)})
-    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
+    with tempfile.NamedTemporaryFile(suffix=".png", delete=False, dir=_RAM_TMP_DIR) as tmp:
         tmp.write(image_bytes)
         tmp.flush()
         tmp_path = tmp.name  # file is closed here when 'with' exits
@@ -287,7 +339,9 @@ def ocr_got(image_bytes: bytes, fmt: str, on_log: Callable[[dict], None] | None
         if on_log:
             on_log({"step": "got_inference", "msg": "Running GOT-OCR inference...", "elapsed_ms": round((time.perf_counter() - t0) * 1000)})
         t_inf = time.perf_counter()
-        result = model.chat(tokenizer, tmp_path_fwd, ocr_type=ocr_type)
+        import torch
+        with torch.inference_mode():
+            result = model.chat(tokenizer, tmp_path_fwd, ocr_type=ocr_type)
         if on_log:
             on_log({"step": "got_done", "msg": f"Inference complete ({len(result)} chars)", "elapsed_ms": round((time.perf_counter() - t_inf) * 1000)})
         return result
@@ -302,13 +356,19 @@ def ocr_got(image_bytes: bytes, fmt: str, on_log: Callable[[dict], None] | None
 # ---------------------------------------------------------------------------
 
 def _make_gemini_client():
-    import google.genai as genai
     api_key = os.environ.get("GEMINI_API_KEY")
     if not api_key:
         raise RuntimeError(
             "GEMINI_API_KEY environment variable is not set. "
             "Get a key at https://aistudio.google.com/apikey"
         )
+    return _gemini_client(api_key)
+
+
+@lru_cache(maxsize=1)
+def _gemini_client(api_key: str):
+    """One shared client (and HTTP connection pool) per API key."""
+    import google.genai as genai
     return genai.Client(api_key=api_key)
 
 
@@ -338,9 +398,17 @@ def translate_text(text: str, target_language: str, fmt: str) -> str:
 
 _texify_model = None
 _texify_processor = None
+_texify_lock = threading.Lock()
 
 
 def _load_texify():
+    if _texify_model is not None:
+        return _texify_model, _texify_processor
+    with _texify_lock:
+        return _load_texify_locked()
+
+
+def _load_texify_locked():
     global _texify_model, _texify_processor
     if _texify_model is not None:
         return _texify_model, _texify_processor
@@ -352,22 +420,75 @@ def _load_texify():
             "texify is not installed. Install with:\n  pip install texify>=0.2.1"
         )
     try:
-        _texify_model = load_model()
-        _texify_processor = load_processor()
+        model = load_model()
+        processor = load_processor()
     except (AttributeError, TypeError) as e:
         raise RuntimeError(
             "texify/transformers version mismatch. Try:\n"
             "  pip install texify>=0.2.1 'transformers>=4.46,<5.0'\n"
             f"Original error: {e}"
         )
-    return _texify_model, _texify_processor
+    # Publish the processor first: _load_texify's unlocked fast path only
+    # checks the model.
+    _texify_processor = processor
+    _texify_model = model
+    return model, processor
+
+
+# Concurrent texify requests are coalesced: the first caller in a window waits
+# briefly, then runs one batch_inference for everything queued meanwhile.
+_TEXIFY_BATCH_WINDOW = 0.025
+_TEXIFY_MAX_BATCH = 16
+_texify_pending: list[tuple[object, Future]] = []
+_texify_pending_lock = threading.Lock()
+_texify_infer_lock = threading.Lock()
+
+
+def _texify_infer(img) -> str:
+    """Queue *img* for the next texify batch and block until its result is ready."""
+    fut: Future = Future()
+    with _texify_pending_lock:
+        _texify_pending.append((img, fut))
+        leader = len(_texify_pending) == 1
+    if leader:
+        time.sleep(_TEXIFY_BATCH_WINDOW)
+        _run_texify_batch()
+    return fut.result()
+
+
+def _run_texify_batch() -> None:
+    # Take the queue only once the previous batch is off the GPU, so requests
+    # arriving during inference join this batch.
+    with _texify_infer_lock:
+        with _texify_pending_lock:
+            pending = _texify_pending[:]
+            _texify_pending.clear()
+        # Every queued future must be resolved, or its caller blocks forever.
+        try:
+            from texify.inference import batch_inference
+
+            model, processor = _load_texify()
+            for i in range(0, len(pending), _TEXIFY_MAX_BATCH):
+                chunk = pending[i:i + _TEXIFY_MAX_BATCH]
+                try:
+                    results = batch_inference([img for img, _ in chunk], model, processor)
+                except Exception as e:
+                    for _, fut in chunk:
+                        fut.set_exception(e)
+                    continue
+                for j, (_, fut) in enumerate(chunk):
+                    fut.set_result(results[j] if j < len(results) else "")
+        except BaseException as e:
+            for _, fut in pending:
+                if not fut.done():
+                    fut.set_exception(e)
+            raise
 
 
 def ocr_texify(image_bytes: bytes, on_log: Callable[[dict], None] | None = None) -> str:
     """OCR an equation crop using texify. Always returns LaTeX."""
     import io
     from PIL import Image
-    from texify.inference import batch_inference
 
     t0 = time.perf_counter()
     if on_log:
@@ -378,14 +499,46 @@ def ocr_texify(image_bytes: bytes, on_log: Callable[[dict], None] | None = None)
 
     if on_log:
         on_log({"step": "texify_prep", "msg": "Preparing image...", "elapsed_ms": round((time.perf_counter() - t0) * 1000)})
-    img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    img = Image.open(io.BytesIO(image_bytes))
+    if img.mode != "RGB":
+        img = img.convert("RGB")  # already-RGB uploads skip the full-image copy
     if on_log:
         on_log({"step": "texify_inference", "msg": "Running texify inference...", "elapsed_ms": round((time.perf_counter() - t0) * 1000)})
     t_inf = time.perf_counter()
-    results = batch_inference([img], model, processor)
+    result = _texify_infer(img)
     if on_log:
         on_log({"step": "texify_done", "msg": "Inference complete", "elapsed_ms": round((time.perf_counter() - t_inf) * 1000)})
-    return results[0] if results else ""
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Startup preload
+# ---------------------------------------------------------------------------
+
+_PRELOADERS: dict[str, Callable[[], object]] = {
+    "got": _load_got,
+    "texify": _load_texify,
+}
+
+
+def preload_models(names: list[str]) -> None:
+    """Load the named local models ahead of the first request.
+
+    Failures are printed rather than raised; the backend then loads (and
+    reports the error) on first use as before.
+    """
+    for name in names:
+        loader = _PRELOADERS.get(name)
+        if loader is None:
+            print(f"PRELOAD_OCR_MODELS: unknown model {name!r} (expected one of {sorted(_PRELOADERS)})")
+            continue
+        t0 = time.perf_counter()
+        try:
+            loader()
+        except Exception as e:
+            print(f"Preloading {name} failed: {e}")
+        else:
+            print(f"Preloaded {name} in {time.perf_counter() - t0:.1f}s")
 
 
 # ---------------------------------------------------------------------------
@@ -2,12 +2,23 @@
 
 from __future__ import annotations
 
+import base64
 import io
+import os
 import re
+import shutil
 import subprocess
-import tempfile
 import zipfile
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import pandoc_server
+
+# Resolved once so each conversion skips the PATH search, and so the resident
+# server is always started from the same executable; None when Pandoc isn't
+# installed.
+_PANDOC_EXE = shutil.which("pandoc")
+# Keep Windows from attaching a console window to each Pandoc run
+_NO_WINDOW = getattr(subprocess, "CREATE_NO_WINDOW", 0)
 
 # Minimal document.xml content for the docx zip
 _DOCUMENT_XML = """\
@@ -28,12 +39,12 @@ _DOCUMENT_XML = """\
             xmlns:wps="http://schemas.microsoft.com/office/word/2010/wordprocessingShape"
             mc:Ignorable="w14 wp14">
   <w:body>
-    <w:p>
-      {omml}
-    </w:p>
+{body}
   </w:body>
 </w:document>
 """
+# Split once so packaging is plain concatenation, not format() parsing
+_DOCUMENT_PREFIX, _DOCUMENT_SUFFIX = _DOCUMENT_XML.split("{body}")
 
 _CONTENT_TYPES_XML = """\
 <?xml version="1.0" encoding="UTF-8" standalone="yes"?>
@@ -61,6 +72,40 @@ _WORD_RELS_XML = """\
 """
 
 
+# <m:r>...</m:r> runs, and an optional leading <m:rPr> inside one
+_MR_RE = re.compile(r'<m:r\b[^>]*>(.*?)</m:r>', re.DOTALL)
+_RPR_RE = re.compile(r'(<m:rPr\b.*?</m:rPr>)(.*)', re.DOTALL)
+# A run (or its <m:rPr>) not immediately followed by <m:t>: bare text may need
+# wrapping.  Well-formed OMML never matches, so _wrap_bare_text_in_mt can
+# return early.
+_BARE_RUN_RE = re.compile(r'<m:r\b[^>]*>(?!<m:t[\s>]|<m:rPr[\s>])|</m:rPr>(?!<m:t[\s>])')
+
+# Everything _strip_html_from_omml deletes, in one pass: opening, closing and
+# self-closing HTML formatting tags Word mixes into clipboard OMML, plus
+# namespace declarations (the docx envelope declares them).
+_OMML_JUNK_RE = re.compile(
+    r'</?(?:font|span|i|b|u|em|strong|br|div|img|a)\b[^>]*>'
+    r'|\s+xmlns:\w+="[^"]*"',
+    re.IGNORECASE,
+)
+
+# Math delimiters Pandoc wraps around its output: \[...\], $...$ or \(...\)
+_DELIMS_RE = re.compile(r'^(?:\\\[|\$|\\\()(.*?)(?:\\\]|\$|\\\))$', re.DOTALL)
+
+_ANY_TAG_RE = re.compile(r'<[^>]+>')
+
+# Cleaned OMML that is nothing but unstyled runs of ASCII letters/digits (an
+# optional <w:rPr> carrying only the math font is allowed), inline or as a
+# single display equation.  Group 1 holds the runs.
+_PLAIN_RUN = r'\s*<m:r>(?:<w:rPr>(?:<w:rFonts\b[^>]*/>)?</w:rPr>)?<m:t>[A-Za-z0-9]*</m:t></m:r>'
+_PLAIN_OMML_RE = re.compile(
+    r'\s*(?:<m:oMathPara>\s*(?:<m:oMathParaPr>\s*<m:jc\b[^>]*/>\s*</m:oMathParaPr>\s*)?)?'
+    r'<m:oMath>((?:' + _PLAIN_RUN + r')+)\s*</m:oMath>'
+    r'(?:\s*</m:oMathPara>)?\s*'
+)
+_MT_TEXT_RE = re.compile(r'<m:t>([^<]*)</m:t>')
+
+
 def _wrap_bare_text_in_mt(xml: str) -> str:
     r"""Wrap bare text inside <m:r> elements with <m:t> tags.
 
@@ -73,13 +118,16 @@ def _wrap_bare_text_in_mt(xml: str) -> str:
 
     Pandoc requires <m:t> to extract content, so we add it.
     """
+    if '<m:r' not in xml or not _BARE_RUN_RE.search(xml):
+        return xml  # already has <m:t> everywhere
+
     def fix_mr(m: re.Match) -> str:
         inner = m.group(1)
         # Check if already has <m:t> — no fix needed
         if '<m:t>' in inner or '<m:t ' in inner:
             return m.group(0)
         # Split into rPr (if present) and the rest
-        rpr_match = re.match(r'(<m:rPr\b.*?</m:rPr>)(.*)', inner, re.DOTALL)
+        rpr_match = _RPR_RE.match(inner)
         if rpr_match:
             rpr = rpr_match.group(1)
             raw = rpr_match.group(2)
@@ -106,50 +154,78 @@ def _wrap_bare_text_in_mt(xml: str) -> str:
         return f'<m:r><m:t>{text}</m:t></m:r>'
 
     # Match <m:r>...</m:r> blocks (non-greedy)
-    return re.sub(r'<m:r\b[^>]*>(.*?)</m:r>', fix_mr, xml, flags=re.DOTALL)
+    return _MR_RE.sub(fix_mr, xml)
 
 
 def _strip_html_from_omml(xml: str) -> str:
-    """Strip HTML formatting tags that Word mixes into clipboard OMML.
+    """Strip HTML formatting tags and namespace declarations from clipboard OMML.
 
     When Word copies to clipboard as HTML, it wraps OMML content in HTML
     formatting tags like <font>, <span>, <i>, <b>, <br> etc.  These are
     not valid inside .docx XML and cause Pandoc to fail.  We strip them
-    while preserving all m: and w: namespace tags and text content.
+    while preserving all m: and w: namespace tags and text content.  The
+    fragment's xmlns declarations go in the same pass, since the envelope
+    provides them.
     """
-    # Remove opening and self-closing HTML tags (no namespace prefix)
-    # This matches tags like <font ...>, <span ...>, <i ...>, <br>, <br/>, etc.
-    xml = re.sub(
-        r'<(?:font|span|i|b|u|em|strong|br|div|img|a)\b[^>]*/?>',
-        '', xml, flags=re.IGNORECASE,
-    )
-    # Remove closing HTML tags
-    xml = re.sub(
-        r'</(?:font|span|i|b|u|em|strong|br|div|img|a)>',
-        '', xml, flags=re.IGNORECASE,
-    )
-    return xml
-
-
-def _build_docx_bytes(omml_xml: str) -> bytes:
-    """Create a minimal .docx (zip) in memory containing the OMML."""
+    return _OMML_JUNK_RE.sub('', xml)
+
+
+# Batched equations are separated by paragraphs holding this marker plus the
+# equation index.  Plain ASCII letters pass through Pandoc's LaTeX writer
+# unescaped, so the output can be split back apart on it.
+_BATCH_MARKER = "WCLMATHSEP"
+_BATCH_SPLIT_RE = re.compile(_BATCH_MARKER + r"(\d+)")
+
+
+def _clean_omml(omml_xml: str) -> str:
+    """Turn a clipboard OMML fragment into XML Pandoc's docx reader accepts."""
     # Strip HTML formatting tags that Word mixes into clipboard OMML
-    # (e.g. <font>, <span>, <i>, <br> wrapping m: elements)
+    # (e.g. <font>, <span>, <i>, <br> wrapping m: elements) and the
+    # fragment's namespace declarations
     omml_clean = _strip_html_from_omml(omml_xml)
-    # Wrap bare text in <m:r> with <m:t> (clipboard HTML omits <m:t>)
-    omml_clean = _wrap_bare_text_in_mt(omml_clean)
-    # Strip namespace declarations from the fragment since the envelope provides them
-    omml_clean = re.sub(r'\s+xmlns:\w+="[^"]*"', '', omml_clean)
-    # BS4's lxml parser lowercases all tag names, but Pandoc needs proper-cased
-    # OMML tags. Restore the correct case.
-    omml_clean = _restore_omml_case(omml_clean)
-    doc_xml = _DOCUMENT_XML.format(omml=omml_clean)
+    # Wrap bare text in <m:r> with <m:t> (clipboard HTML omits <m:t>).
+    # No case fix-up is needed: parser.py extracts OMML from the raw HTML
+    # before lxml parses it, so tag names arrive in their original case.
+    return _wrap_bare_text_in_mt(omml_clean)
+
 
+def _plain_run_latex(omml_clean: str) -> str | None:
+    """LaTeX for cleaned OMML that is just one letter or a number, else None.
+
+    Pandoc writes such an equation out as its bare text, so the round trip
+    can be skipped.  Runs with <m:rPr> never qualify: their style turns into
+    \\mathbf{...}, \\mathrm{...} and the like.
+    """
+    m = _PLAIN_OMML_RE.fullmatch(omml_clean)
+    if m is None:
+        return None
+    text = "".join(_MT_TEXT_RE.findall(m.group(1)))
+    if text.isdigit() or (len(text) == 1 and text.isalpha()):
+        return text
+    return None
+
+
+def _build_docx_template() -> bytes:
+    """Zip the docx members that never change, once at import."""
     buf = io.BytesIO()
     with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as zf:
         zf.writestr('[Content_Types].xml', _CONTENT_TYPES_XML)
         zf.writestr('_rels/.rels', _RELS_XML)
         zf.writestr('word/_rels/document.xml.rels', _WORD_RELS_XML)
+    return buf.getvalue()
+
+
+_DOCX_TEMPLATE_BYTES = _build_docx_template()
+
+
+def _package_docx(body_xml: str) -> bytes:
+    """Zip *body_xml* (``<w:p>`` elements) into a minimal .docx in memory."""
+    doc_xml = _DOCUMENT_PREFIX + body_xml + _DOCUMENT_SUFFIX
+
+    # Append document.xml to the prebuilt template.  It is stored, not
+    # deflated: Pandoc reads it once, so compressing it is wasted work.
+    buf = io.BytesIO(_DOCX_TEMPLATE_BYTES)
+    with zipfile.ZipFile(buf, 'a', zipfile.ZIP_STORED) as zf:
         zf.writestr('word/document.xml', doc_xml)
     return buf.getvalue()
 
@@ -163,168 +239,129 @@ def omml_to_latex(omml_xml: str) -> str:
     Returns:
         LaTeX math string (without delimiters like $ or \\[\\])
     """
-    docx_bytes = _build_docx_bytes(omml_xml)
+    return try_omml_to_latex(omml_xml)[0]
 
-    try:
-        # Write to a temp file since Pandoc needs a seekable docx
-        with tempfile.NamedTemporaryFile(suffix='.docx', delete=False) as tmp:
-            tmp.write(docx_bytes)
-            tmp_path = tmp.name
 
-        result = subprocess.run(
-            ["pandoc", tmp_path, "-f", "docx", "-t", "latex", "--wrap=none"],
-            capture_output=True,
-            text=True,
-            encoding="utf-8",
-            timeout=10,
-        )
+def try_omml_to_latex(omml_xml: str) -> tuple[str, bool]:
+    """Like :func:`omml_to_latex`, but also report whether the conversion worked.
+
+    Returns ``(latex, converted)``; *converted* is False when Pandoc failed
+    and *latex* is only the plain-text fallback, which callers shouldn't cache.
+    """
+    omml_clean = _clean_omml(omml_xml)
+    latex = _plain_run_latex(omml_clean)
+    if latex is not None:
+        return latex, True
+    latex = _docx_to_latex(_package_docx(f"    <w:p>{omml_clean}</w:p>"))
+    if latex is None:
+        return _fallback_text_extract(omml_xml), False
+    return _strip_math_delimiters(latex.strip()), True
+
+
+def omml_batch_to_latex(omml_xmls: list[str]) -> list[str]:
+    """Convert several OMML fragments with a single Pandoc conversion.
+
+    Each equation gets its own paragraph, preceded by an index marker
+    paragraph, and the LaTeX output is split back on the markers.  If Pandoc
+    rejects the batch (one bad equation fails the whole document) or the
+    markers don't line up, every fragment is converted on its own instead.
+    Lone letters and numbers are answered directly and left out of the batch.
+    """
+    return [latex for latex, _ in try_omml_batch_to_latex(omml_xmls)]
 
-        Path(tmp_path).unlink(missing_ok=True)
 
-        if result.returncode != 0:
-            return _fallback_text_extract(omml_xml)
+def try_omml_batch_to_latex(omml_xmls: list[str]) -> list[tuple[str, bool]]:
+    """Like :func:`omml_batch_to_latex`, with a *converted* flag per fragment.
+
+    See :func:`try_omml_to_latex`.
+    """
+    cleaned = [_clean_omml(xml) for xml in omml_xmls]
+    plain = [_plain_run_latex(c) for c in cleaned]
+    results: list[tuple[str, bool] | None] = [
+        None if latex is None else (latex, True) for latex in plain
+    ]
+    pending = [i for i, latex in enumerate(plain) if latex is None]
+
+    if len(pending) >= 2:
+        paragraphs: list[str] = []
+        for n, i in enumerate(pending):
+            paragraphs.append(f"    <w:p><w:r><w:t>{_BATCH_MARKER}{n}</w:t></w:r></w:p>")
+            paragraphs.append(f"    <w:p>{cleaned[i]}</w:p>")
+        latex = _docx_to_latex(_package_docx("\n".join(paragraphs)))
+
+        if latex is not None:
+            pieces = _BATCH_SPLIT_RE.split(latex)
+            # [preamble, "0", eq0, "1", eq1, ...]
+            if pieces[1::2] == [str(n) for n in range(len(pending))]:
+                for i, piece in zip(pending, pieces[2::2]):
+                    results[i] = (_strip_math_delimiters(piece.strip()), True)
+                return results
+
+    for i, result in zip(pending, _convert_each([omml_xmls[i] for i in pending])):
+        results[i] = result
+    return results
+
+
+def _convert_each(omml_xmls: list[str]) -> list[tuple[str, bool]]:
+    """Convert fragments one Pandoc call each, running the calls concurrently.
+
+    The work happens in Pandoc (a subprocess or the resident server), so
+    threads overlap fine without holding the GIL.
+    """
+    if len(omml_xmls) < 2:
+        return [try_omml_to_latex(xml) for xml in omml_xmls]
+    workers = min(len(omml_xmls), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(try_omml_to_latex, omml_xmls))
+
 
-        latex = result.stdout.strip()
-        latex = _strip_math_delimiters(latex)
-        return latex
+def _docx_to_latex(docx_bytes: bytes) -> str | None:
+    """Run a docx through Pandoc and return its LaTeX, or None if Pandoc failed.
 
-    except FileNotFoundError:
+    Raises RuntimeError when Pandoc is not installed.
+    """
+    if _PANDOC_EXE is None:
         raise RuntimeError(
             "Pandoc is not installed or not on PATH. "
             "Install it from https://pandoc.org/installing.html"
         )
+
+    # Prefer the resident pandoc server: one process for every equation
+    # instead of a fork/exec + runtime start-up per call.
+    try:
+        out = pandoc_server.convert(
+            base64.b64encode(docx_bytes).decode("ascii"), "docx", "latex", _PANDOC_EXE,
+            wrap="none",
+        )
+    except RuntimeError:
+        return None
+    if out is not None:
+        return out.decode("utf-8", errors="replace")
+
+    try:
+        # Pandoc reads binary formats from stdin too, so no temp file is needed
+        result = subprocess.run(
+            [_PANDOC_EXE, "-f", "docx", "-t", "latex", "--wrap=none"],
+            input=docx_bytes,
+            capture_output=True,
+            timeout=10,
+            creationflags=_NO_WINDOW,
+        )
     except subprocess.TimeoutExpired:
-        return _fallback_text_extract(omml_xml)
+        return None
+
+    if result.returncode != 0:
+        return None
+    return result.stdout.decode("utf-8", errors="replace")
 
 
 def _strip_math_delimiters(latex: str) -> str:
     """Remove Pandoc's math delimiters to get bare math content."""
-    # Remove display math \[...\]
-    latex = re.sub(r'^\\\[', '', latex)
-    latex = re.sub(r'\\\]$', '', latex)
-    # Remove inline math $...$
-    if latex.startswith('$') and latex.endswith('$'):
-        latex = latex[1:-1]
-    # Remove \(...\)
-    latex = re.sub(r'^\\\(', '', latex)
-    latex = re.sub(r'\\\)$', '', latex)
-    return latex.strip()
+    m = _DELIMS_RE.match(latex)
+    return (m.group(1) if m else latex).strip()
 
 
 def _fallback_text_extract(xml: str) -> str:
     """Extract plain text from OMML XML as a last resort."""
-    text = re.sub(r'<[^>]+>', '', xml)
+    text = _ANY_TAG_RE.sub('', xml)
     return text.strip()
-
-
-# Mapping of lowercased OMML/WordML tag names to their proper case.
-# These are the standard OOXML math namespace (m:) and wordprocessingml (w:) tags.
-_OMML_TAG_CASE = {
-    # Math tags (m: namespace)
-    "m:omath": "m:oMath",
-    "m:omathpara": "m:oMathPara",
-    "m:r": "m:r",
-    "m:t": "m:t",
-    "m:f": "m:f",
-    "m:fpr": "m:fPr",
-    "m:num": "m:num",
-    "m:den": "m:den",
-    "m:e": "m:e",
-    "m:sub": "m:sub",
-    "m:sup": "m:sup",
-    "m:ssub": "m:sSub",
-    "m:ssup": "m:sSup",
-    "m:ssubsup": "m:sSubSup",
-    "m:nary": "m:nary",
-    "m:narypr": "m:naryPr",
-    "m:chr": "m:chr",
-    "m:limloc": "m:limLoc",
-    "m:limlow": "m:limLow",
-    "m:limupp": "m:limUpp",
-    "m:lim": "m:lim",
-    "m:rad": "m:rad",
-    "m:radpr": "m:radPr",
-    "m:deghide": "m:degHide",
-    "m:deg": "m:deg",
-    "m:func": "m:func",
-    "m:funcpr": "m:funcPr",
-    "m:fname": "m:fName",
-    "m:d": "m:d",
-    "m:dpr": "m:dPr",
-    "m:begchr": "m:begChr",
-    "m:endchr": "m:endChr",
-    "m:eqarr": "m:eqArr",
-    "m:m": "m:m",
-    "m:mr": "m:mr",
-    "m:mpr": "m:mPr",
-    "m:mcs": "m:mcs",
-    "m:mc": "m:mc",
-    "m:mcpr": "m:mcPr",
-    "m:count": "m:count",
-    "m:mcjc": "m:mcJc",
-    "m:ctrlpr": "m:ctrlPr",
-    "m:rpr": "m:rPr",
-    "m:sty": "m:sty",
-    "m:brk": "m:brk",
-    "m:aln": "m:aln",
-    "m:bar": "m:bar",
-    "m:barpr": "m:barPr",
-    "m:pos": "m:pos",
-    "m:box": "m:box",
-    "m:boxpr": "m:boxPr",
-    "m:acc": "m:acc",
-    "m:accpr": "m:accPr",
-    "m:groupchr": "m:groupChr",
-    "m:groupchrpr": "m:groupChrPr",
-    "m:borderbox": "m:borderBox",
-    "m:borderboxpr": "m:borderBoxPr",
-    "m:phantom": "m:phantom",
-    "m:phantpr": "m:phantPr",
-    "m:val": "m:val",
-    # WordprocessingML tags commonly found inside OMML
-    "w:rpr": "w:rPr",
-    "w:rfonts": "w:rFonts",
-    "w:ascii": "w:ascii",
-    "w:i": "w:i",
-    "w:b": "w:b",
-}
-
-# Build a regex that matches namespaced tags in opening/closing/self-closing form.
-_OMML_TAG_RE = re.compile(
-    r'(</?)'                       # opening < or </
-    r'(m:[a-zA-Z]+|w:[a-zA-Z]+)'  # namespaced tag (any case)
-    r'(?=[\s/>])',                 # followed by space, /, or >
-)
-
-_OMML_ATTR_RE = re.compile(
-    r'\s(m:[a-zA-Z]+|w:[a-zA-Z]+)(=)',  # namespaced attribute name
-)
-
-
-def _restore_omml_case(xml: str) -> str:
-    """Restore proper case for OMML tag and attribute names after BS4 lowercasing.
-
-    Important: if a tag is already properly cased (e.g. from the placeholder
-    extraction path), we must preserve its original case, not lowercase it.
-    """
-    def replace_tag(m: re.Match) -> str:
-        prefix = m.group(1)  # < or </
-        tag_original = m.group(2)
-        tag_lower = tag_original.lower()
-        proper = _OMML_TAG_CASE.get(tag_lower)
-        if proper is not None:
-            return prefix + proper
-        # Not in mapping — keep original case (don't lowercase it)
-        return prefix + tag_original
-
-    def replace_attr(m: re.Match) -> str:
-        attr_original = m.group(1)
-        attr_lower = attr_original.lower()
-        proper = _OMML_TAG_CASE.get(attr_lower)
-        if proper is not None:
-            return ' ' + proper + m.group(2)
-        return ' ' + attr_original + m.group(2)
-
-    xml = _OMML_TAG_RE.sub(replace_tag, xml)
-    xml = _OMML_ATTR_RE.sub(replace_attr, xml)
-    return xml
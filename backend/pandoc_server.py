@@ -0,0 +1,155 @@
+"""Long-lived ``pandoc server`` process, so conversions don't pay Pandoc's startup per call.
+
+``pandoc server`` ships with Pandoc 3.0+.  It is started lazily on the first
+conversion and bound to a free loopback port.  When it can't be started
+(older Pandoc, server support compiled out, slow cold start), :func:`convert`
+returns ``None`` and callers fall back to the one-shot ``pandoc`` CLI; startup
+is retried after a backoff.
+"""
+
+from __future__ import annotations
+
+import atexit
+import base64
+import json
+import socket
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+
+_STARTUP_TIMEOUT = 5.0
+_REQUEST_TIMEOUT = 30
+_RETRY_BACKOFF = 30.0
+# Keep Windows from attaching a console window to the server for the session
+_NO_WINDOW = getattr(subprocess, "CREATE_NO_WINDOW", 0)
+
+_lock = threading.Lock()
+_proc: subprocess.Popen | None = None
+_port: int | None = None
+_retry_at = 0.0  # monotonic time before which startup isn't attempted again
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_port(proc: subprocess.Popen, port: int) -> bool:
+    deadline = time.monotonic() + _STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            return False
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+def _ensure_server(pandoc_path: str) -> int | None:
+    """Start the server if needed and return its port, or None if unavailable."""
+    global _proc, _port, _retry_at
+    with _lock:
+        if _proc is not None and _proc.poll() is None:
+            return _port
+        if time.monotonic() < _retry_at:
+            return None
+        port = _free_port()
+        try:
+            proc = subprocess.Popen(
+                [pandoc_path, "server", "--port", str(port), "--timeout", str(_REQUEST_TIMEOUT)],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                creationflags=_NO_WINDOW,
+            )
+        except OSError:
+            _retry_at = time.monotonic() + _RETRY_BACKOFF
+            return None
+        if not _wait_for_port(proc, port):
+            proc.kill()
+            _retry_at = time.monotonic() + _RETRY_BACKOFF
+            return None
+        _proc, _port = proc, port
+        return port
+
+
+def convert(
+    text: str,
+    from_fmt: str,
+    to_fmt: str,
+    pandoc_path: str = "pandoc",
+    **options,
+) -> bytes | None:
+    """Convert *text* through the resident server.
+
+    Binary input formats (e.g. docx) must be passed base64-encoded.  Extra
+    keyword *options* are sent as pandoc-server JSON fields (``standalone``,
+    ``wrap``, ...).
+
+    Returns ``None`` when the server is unavailable so the caller can fall
+    back to spawning ``pandoc`` directly.
+
+    Raises
+    ------
+    RuntimeError
+        When Pandoc rejects the document or the conversion times out.
+    """
+    port = _ensure_server(pandoc_path)
+    if port is None:
+        return None
+
+    payload = json.dumps({
+        "text": text,
+        "from": from_fmt,
+        "to": to_fmt,
+        **options,
+    }).encode("utf-8")
+    req = urllib.request.Request(
+        f"http://127.0.0.1:{port}/",
+        data=payload,
+        headers={"Content-Type": "application/json", "Accept": "application/json"},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(req, timeout=_REQUEST_TIMEOUT) as resp:
+            body = json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        detail = e.read().decode("utf-8", errors="replace").strip()
+        raise RuntimeError(detail or f"pandoc server returned HTTP {e.code}") from e
+    except (urllib.error.URLError, OSError) as e:
+        if isinstance(e, socket.timeout) or isinstance(getattr(e, "reason", None), socket.timeout):
+            # The server is fine; this document is just too slow to convert.
+            raise RuntimeError(
+                f"pandoc server timed out after {_REQUEST_TIMEOUT} s"
+            ) from e
+        # Let the caller use the CLI.  A dead server is restarted by the next
+        # _ensure_server call; a live one is left alone for other requests.
+        return None
+
+    if "error" in body:
+        raise RuntimeError(body["error"])
+    output = body.get("output", "")
+    if body.get("base64"):
+        return base64.b64decode(output)
+    return output.encode("utf-8")
+
+
+def shutdown() -> None:
+    """Stop the server process if it is running."""
+    global _proc, _port
+    with _lock:
+        if _proc is not None and _proc.poll() is None:
+            _proc.terminate()
+            try:
+                _proc.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                _proc.kill()
+        _proc, _port = None, None
+
+
+atexit.register(shutdown)
@@ -3,19 +3,22 @@
 from __future__ import annotations
 
 import re
+from collections.abc import Iterator
 from dataclasses import dataclass, field
 from enum import Enum
 
-from bs4 import BeautifulSoup, NavigableString, Tag
+from lxml import etree
+from lxml.html import HtmlElement, document_fromstring, tostring
 
-# Lazy imports for OMML conversion in list items (avoids heavy deps at parse start)
+from math_cache import cached_math
+
+
+# Shares the converter's math cache, so repeated list-item symbols only hit
+# Pandoc once.
 def _omml_to_inline_latex(xml: str) -> str:
     """Convert OMML XML to inline LaTeX ($...$). Returns empty string on failure."""
     try:
-        from omml_to_latex import omml_to_latex
-        from postprocess import postprocess_latex
-        latex = omml_to_latex(xml)
-        return postprocess_latex(latex).strip()
+        return cached_math(xml).strip()
     except Exception:
         return ""
 
@@ -31,7 +34,7 @@ class NodeType(str, Enum):
     CODE_LINE = "code_line"  # intermediate: monospace <p>, grouped into code blocks
 
 
-@dataclass
+@dataclass(slots=True)
 class DocNode:
     type: NodeType
     content: str = ""
@@ -47,9 +50,17 @@ class DocNode:
 # Regex to detect Word heading classes like MsoHeading1, MsoHeading2, etc.
 HEADING_RE = re.compile(r"MsoHeading(\d)", re.IGNORECASE)
 
+_WS_RE = re.compile(r'\s+')
+
 # HTML tags that represent inline formatting and should be preserved as-is
 _FORMATTING_TAGS = {"b", "strong", "i", "em", "u", "sup", "sub", "s", "strike"}
 
+_LIST_TAGS = frozenset({"ul", "ol"})
+_HEADING_TAGS = frozenset({"h1", "h2", "h3", "h4", "h5", "h6"})
+
+# Word field / annotation tags that carry no visible text
+_EMPTY_WORD_TAGS = frozenset({"o:p", "w:bookmarkstart", "w:bookmarkend"})
+
 # Monospace font names that indicate code content (case-insensitive substrings)
 _MONOSPACE_FONTS = frozenset({
     "courier new", "courier", "consolas", "monaco",
@@ -57,7 +68,7 @@ _MONOSPACE_FONTS = frozenset({
 })
 
 # Placeholder used to survive HTML parsing: replaces each space in
-# mso-spacerun:yes spans before feeding to BS4/lxml.
+# mso-spacerun:yes spans before feeding to lxml.
 # lxml strips all C0 control characters (0x00–0x1F), so we use a Unicode
 # Private Use Area codepoint (U+E000) that lxml preserves and that never
 # legitimately appears in Word document text.
@@ -74,56 +85,39 @@ _SPACERUN_RE = re.compile(
 # Conditional comment unwrapping
 # ---------------------------------------------------------------------------
 
-# Regex to extract OMML from Word conditional comments.
-# Matches: <!--[if gte msEquation 12]> ... <![endif]-->
-_OMML_CONDITIONAL_RE = re.compile(
-    r'<!--\[if\s+gte\s+msEquation\s+\d+\]>(.*?)<!\[endif\]-->',
+# Word conditional comments, handled in one pass:
+#   <!--[if gte msEquation 12]> ... <![endif]-->  OMML — unwrapped (group 1 set)
+#   <!--[if !msEquation]> ... <![endif]-->        equation fallback — stripped
+#   <!--[if gte vml 1]> ... <![endif]--> etc.     VML, supportLists — stripped
+_CONDITIONAL_RE = re.compile(
+    r'<!--\[if\s+(?:(gte\s+msEquation\s+\d+)|[^\]]*)\]>(.*?)<!\[endif\]-->',
     re.DOTALL | re.IGNORECASE,
 )
 
-# Regex to strip the fallback (non-equation) conditional comment blocks.
-# Matches: <!--[if !msEquation]> ... <![endif]-->
-_FALLBACK_CONDITIONAL_RE = re.compile(
-    r'<!--\[if\s+!msEquation\]>.*?<!\[endif\]-->',
-    re.DOTALL | re.IGNORECASE,
-)
 
-# Regex to strip all remaining conditional comments (VML, supportedlists, etc.)
-# This catches <!--[if gte vml 1]>...<![endif]--> and similar.
-_REMAINING_CONDITIONAL_RE = re.compile(
-    r'<!--\[if\s[^\]]*\]>.*?<!\[endif\]-->',
-    re.DOTALL,
-)
+def _replace_conditional(m: re.Match) -> str:
+    return m.group(2) if m.group(1) else ''
 
 
 def _unwrap_omml_conditionals(html: str) -> str:
     """Unwrap OMML from Word conditional comments and strip the rest."""
-    # Unwrap OMML equations (keep inner content)
-    html = _OMML_CONDITIONAL_RE.sub(r'\1', html)
-    # Strip OMML fallback blocks
-    html = _FALLBACK_CONDITIONAL_RE.sub('', html)
-    # Strip all remaining conditional comments (VML images, etc.)
-    html = _REMAINING_CONDITIONAL_RE.sub('', html)
-    return html
+    return _CONDITIONAL_RE.sub(_replace_conditional, html)
 
 
 # ---------------------------------------------------------------------------
-# OMML placeholder extraction — the key to avoiding BS4 mangling
+# OMML placeholder extraction — the key to avoiding HTML-parser mangling
 # ---------------------------------------------------------------------------
 
-# Match <m:oMathPara ...>...</m:oMathPara> (display math blocks)
-_OMATHPARA_RE = re.compile(
-    r'(<m:oMathPara\b[^>]*>.*?</m:oMathPara>)',
-    re.DOTALL | re.IGNORECASE,
-)
-
-# Match standalone <m:oMath ...>...</m:oMath> (inline math, after display extracted)
-_OMATH_RE = re.compile(
-    r'(<m:oMath\b[^>]*>.*?</m:oMath>)',
+# Match <m:oMathPara ...>...</m:oMathPara> (display math, group 1) or a
+# standalone <m:oMath ...>...</m:oMath> (inline math, group 2) in one scan.
+# oMathPara is tried first at each position, so the oMath elements inside a
+# display block are never picked up on their own.
+_OMML_BLOCK_RE = re.compile(
+    r'(<m:oMathPara\b[^>]*>.*?</m:oMathPara>)|(<m:oMath\b[^>]*>.*?</m:oMath>)',
     re.DOTALL | re.IGNORECASE,
 )
 
-# Placeholder tag format — BS4 treats these as simple unknown HTML tags
+# Placeholder tag format — lxml treats these as simple unknown HTML tags
 _DISPLAY_PLACEHOLDER = '<omml-display data-id="{}"></omml-display>'
 _INLINE_PLACEHOLDER = '<omml-inline data-id="{}"></omml-inline>'
 
@@ -139,38 +133,37 @@ def _extract_omml_blocks(html: str) -> tuple[str, dict[str, str], dict[str, str]
     inline_blocks: dict[str, str] = {}
     counter = 0
 
-    def replace_display(m: re.Match) -> str:
-        nonlocal counter
-        block_id = str(counter)
-        counter += 1
-        display_blocks[block_id] = m.group(1)
-        return _DISPLAY_PLACEHOLDER.format(block_id)
-
-    def replace_inline(m: re.Match) -> str:
+    def replace(m: re.Match) -> str:
         nonlocal counter
         block_id = str(counter)
         counter += 1
-        inline_blocks[block_id] = m.group(1)
+        display_xml = m.group(1)
+        if display_xml:
+            display_blocks[block_id] = display_xml
+            return _DISPLAY_PLACEHOLDER.format(block_id)
+        inline_blocks[block_id] = m.group(2)
         return _INLINE_PLACEHOLDER.format(block_id)
 
-    # Extract display math first (oMathPara contains oMath)
-    html = _OMATHPARA_RE.sub(replace_display, html)
-    # Then extract remaining standalone inline math
-    html = _OMATH_RE.sub(replace_inline, html)
+    html = _OMML_BLOCK_RE.sub(replace, html)
 
     return html, display_blocks, inline_blocks
 
 
+_EQARR_OPEN_RE = re.compile(r'<m:eqArr', re.IGNORECASE)
+_OMATH_OPEN_RE = re.compile(r'<m:oMath\b', re.IGNORECASE)
+_MATRIX_OPEN_RE = re.compile(r'<m:m\b', re.IGNORECASE)
+
+
 def _detect_math_env_from_xml(xml: str) -> str:
     """Detect special math environment from raw OMML XML string."""
-    xml_lower = xml.lower()
-    if "<m:eqarr" in xml_lower:
+    if _EQARR_OPEN_RE.search(xml):
         return "aligned"
-    # Multiple <m:oMath> inside one <m:oMathPara> = multi-line display
-    omath_count = len(re.findall(r'<m:oMath\b', xml, re.IGNORECASE))
-    if omath_count > 1:
+    # Multiple <m:oMath> inside one <m:oMathPara> = multi-line display;
+    # stop at the second one rather than counting them all
+    first = _OMATH_OPEN_RE.search(xml)
+    if first and _OMATH_OPEN_RE.search(xml, first.end()):
         return "multiline"
-    if re.search(r'<m:m\b', xml_lower):
+    if _MATRIX_OPEN_RE.search(xml):
         return "pmatrix"
     return ""
 
@@ -185,7 +178,7 @@ def _preserve_spacerun_indent(html: str) -> str:
     lxml's HTML parser may collapse or reorder whitespace inside inline
     elements, losing the indentation that Word encodes in these spans.
     By swapping each space for a non-whitespace marker *before* parsing,
-    the count survives through BS4 into _extract_code_line_text.
+    the count survives parsing into _extract_code_line_text.
     Newlines inside the span (HTML source formatting) are simply dropped.
     """
     def replace(m: re.Match) -> str:
@@ -197,22 +190,31 @@ def _preserve_spacerun_indent(html: str) -> str:
     return _SPACERUN_RE.sub(replace, html)
 
 
+# lxml refuses str input that starts with an encoding declaration (raw OOXML)
+_XML_DECL_RE = re.compile(r'^\s*<\?xml\b[^>]*\?>')
+
+
 def parse_clipboard_html(html: str) -> list[DocNode]:
     """Parse Word clipboard HTML into a list of DocNode objects."""
     # Step 1: Unwrap OMML from conditional comments
     html = _unwrap_omml_conditionals(html)
 
-    # Step 2: Extract OMML blocks BEFORE BS4 can mangle them.
-    # BS4's lxml parser lowercases tags, restructures self-closing tags,
+    # Step 2: Extract OMML blocks BEFORE the HTML parser can mangle them.
+    # lxml's HTML parser lowercases tags, restructures self-closing tags,
     # and reorders attributes — all of which break Pandoc's XML parsing.
     html, display_blocks, inline_blocks = _extract_omml_blocks(html)
 
     # Step 2b: Preserve mso-spacerun indentation before lxml can collapse it.
     html = _preserve_spacerun_indent(html)
 
-    # Step 3: Now let BS4 parse the cleaned HTML (no OMML, just placeholders)
-    soup = BeautifulSoup(html, "lxml")
-    body = soup.body or soup
+    # Step 3: Now let lxml parse the cleaned HTML (no OMML, just placeholders)
+    try:
+        root = document_fromstring(_XML_DECL_RE.sub('', html, count=1))
+    except etree.ParserError:
+        return []  # empty document
+    body = root.find("body")
+    if body is None:
+        body = root
 
     nodes: list[DocNode] = []
     _walk_elements(body, nodes, display_blocks, inline_blocks)
@@ -224,24 +226,60 @@ def parse_clipboard_html(html: str) -> list[DocNode]:
 # Tree walking
 # ---------------------------------------------------------------------------
 
+def _iter_children(element: HtmlElement) -> Iterator[str | HtmlElement]:
+    """Yield an element's text runs and child elements in document order.
+
+    Text runs are the element's ``.text`` and each child's ``.tail``.
+    Comments are skipped, but their tails are not.
+    """
+    if element.text:
+        yield element.text
+    for child in element:
+        if isinstance(child.tag, str):
+            yield child
+        if child.tail:
+            yield child.tail
+
+
+def _iter_descendants(
+    element: HtmlElement,
+) -> Iterator[tuple[str | HtmlElement, HtmlElement]]:
+    """Yield ``(node, parent)`` for every text run and element below *element*."""
+    if element.text:
+        yield element.text, element
+    for child in element:
+        if isinstance(child.tag, str):
+            yield child, element
+            yield from _iter_descendants(child)
+        if child.tail:
+            yield child.tail, element
+
+
+def _get_text(element: HtmlElement) -> str:
+    """Concatenated text of *element* and its descendants (comments excluded)."""
+    return "".join(element.itertext())
+
+
+def _outer_html(element: HtmlElement) -> str:
+    return tostring(element, encoding="unicode", with_tail=False)
+
+
 def _walk_elements(
-    parent: Tag,
+    parent: HtmlElement,
     nodes: list[DocNode],
     display_blocks: dict[str, str],
     inline_blocks: dict[str, str],
 ) -> None:
     """Recursively walk HTML elements and build DocNode list."""
-    for child in parent.children:
-        if isinstance(child, NavigableString):
-            text = _normalize_text(str(child))
-            if text and text not in ("StartFragment", "EndFragment"):
+    for child in _iter_children(parent):
+        if isinstance(child, str):
+            text = _normalize_text(child)
+            if text:
                 nodes.append(DocNode(type=NodeType.TEXT, content=text, html=text))
             continue
 
-        if not isinstance(child, Tag):
-            continue
-
-        tag_name = child.name.lower() if child.name else ""
+        # lxml's HTML parser already lowercases tag names
+        tag_name = child.tag
 
         # Check for our OMML placeholders
         if tag_name == "omml-display":
@@ -272,13 +310,13 @@ def _walk_elements(
             continue
 
         # Check for list elements
-        if tag_name in ("ul", "ol"):
+        if tag_name in _LIST_TAGS:
             _handle_list(child, nodes)
             continue
 
         # Handle <pre> elements as fenced code blocks
         if tag_name == "pre":
-            code = child.get_text().strip('\n\r')
+            code = _get_text(child).strip('\n\r')
             if code:
                 nodes.append(DocNode(type=NodeType.TEXT, content=f"```\n{code}\n```", html=""))
             continue
@@ -291,12 +329,12 @@ def _walk_elements(
         # Check for headings (h1-h6 or Word's MsoHeading class)
         heading_level = _detect_heading(child)
         if heading_level:
-            text = child.get_text(strip=True)
+            text = "".join([s.strip() for s in child.itertext()])
             nodes.append(DocNode(type=NodeType.HEADING, content=text, level=heading_level))
             continue
 
         # Check for w:p (Word paragraph) tags — these appear when parsing raw OOXML
-        if tag_name in ("w:p",):
+        if tag_name == "w:p":
             _handle_word_paragraph(child, nodes, display_blocks, inline_blocks)
             continue
 
@@ -304,48 +342,53 @@ def _walk_elements(
         _walk_elements(child, nodes, display_blocks, inline_blocks)
 
 
-def _detect_heading(tag: Tag) -> int | None:
+def _detect_heading(tag: HtmlElement) -> int | None:
     """Detect heading level from tag name or Word CSS class."""
-    name = tag.name.lower() if tag.name else ""
-    if name in ("h1", "h2", "h3", "h4", "h5", "h6"):
+    name = tag.tag
+    if name in _HEADING_TAGS:
         return int(name[1])
 
-    cls = tag.get("class", [])
-    if isinstance(cls, str):
-        cls = cls.split()
-    for c in cls:
+    cls = tag.get("class")
+    for c in cls.split() if cls else ():
         m = HEADING_RE.match(c)
         if m:
             return int(m.group(1))
     return None
 
 
-def _get_list_level(p_tag: Tag) -> int | None:
+_MSO_LIST_LEVEL_RE = re.compile(r'mso-list\s*:[^;]*level(\d+)', re.IGNORECASE)
+_MSO_LIST_PARAGRAPH_RE = re.compile(r'msolistparagraph', re.IGNORECASE)
+_MSO_LIST_CLASS_RE = re.compile(r'mso\w*list', re.IGNORECASE)
+
+# Spaces hugging inline math in parentheses, and bullet glyphs Word leaves behind
+_PAREN_MATH_RE = re.compile(r'\(\s*(\$[^$]+\$)\s*\)')
+_LEADING_BULLET_RE = re.compile(r'^[·•◦▪▫○●◉◌▸▹▶▷‣⁃§o]\s*')
+
+
+def _get_list_level(p_tag: HtmlElement) -> int | None:
     """Return the mso-list nesting level (1-based) if this is a Word list item, else None."""
     style = p_tag.get("style", "")
-    m = re.search(r'mso-list\s*:[^;]*level(\d+)', style, re.IGNORECASE)
+    m = _MSO_LIST_LEVEL_RE.search(style)
     if m:
         return int(m.group(1))
     # Fallback: MsoListParagraph* classes without explicit mso-list style
-    cls = p_tag.get("class", [])
-    if isinstance(cls, str):
-        cls = cls.split()
-    for c in cls:
-        if re.match(r'msolistparagraph', c, re.IGNORECASE):
+    cls = p_tag.get("class")
+    for c in cls.split() if cls else ():
+        if _MSO_LIST_PARAGRAPH_RE.match(c):
             return 1
     return None
 
 
 def _handle_paragraph(
-    p_tag: Tag,
+    p_tag: HtmlElement,
     nodes: list[DocNode],
     display_blocks: dict[str, str],
     inline_blocks: dict[str, str],
 ) -> None:
     """Process a <p> that may contain mixed text and inline math placeholders."""
     # Check if the paragraph contains a display math placeholder
-    display_placeholder = p_tag.find("omml-display")
-    if display_placeholder:
+    display_placeholder = p_tag.find(".//omml-display")
+    if display_placeholder is not None:
         block_id = display_placeholder.get("data-id", "")
         xml = display_blocks.get(block_id, "")
         if xml:
@@ -360,7 +403,7 @@ def _handle_paragraph(
     # Check heading via class
     heading_level = _detect_heading(p_tag)
     if heading_level:
-        text = p_tag.get_text(strip=True)
+        text = "".join([s.strip() for s in p_tag.itertext()])
         nodes.append(DocNode(type=NodeType.HEADING, content=text, level=heading_level))
         return
 
@@ -388,20 +431,20 @@ def _handle_paragraph(
             nodes.append(DocNode(
                 type=NodeType.PARAGRAPH,
                 children=para_children,
-                html=str(p_tag),
+                html=_outer_html(p_tag),
             ))
 
 
 def _handle_word_paragraph(
-    wp_tag: Tag,
+    wp_tag: HtmlElement,
     nodes: list[DocNode],
     display_blocks: dict[str, str],
     inline_blocks: dict[str, str],
 ) -> None:
     """Process a <w:p> Word paragraph (from raw OOXML)."""
     # Check for display math placeholder inside
-    display_placeholder = wp_tag.find("omml-display")
-    if display_placeholder:
+    display_placeholder = wp_tag.find(".//omml-display")
+    if display_placeholder is not None:
         block_id = display_placeholder.get("data-id", "")
         xml = display_blocks.get(block_id, "")
         if xml:
@@ -415,9 +458,8 @@ def _handle_word_paragraph(
 
     # Extract text from <w:t> tags and inline math placeholders
     para_children: list[DocNode] = []
-    for wt in wp_tag.find_all(["w:t", "omml-inline"]):
-        tag_name = wt.name.lower() if wt.name else ""
-        if tag_name == "omml-inline":
+    for wt in wp_tag.iter("w:t", "omml-inline"):
+        if wt.tag == "omml-inline":
             block_id = wt.get("data-id", "")
             xml = inline_blocks.get(block_id, "")
             if xml:
@@ -425,8 +467,8 @@ def _handle_word_paragraph(
                     type=NodeType.INLINE_MATH,
                     omml_xml=xml,
                 ))
-        elif tag_name == "w:t":
-            text = wt.get_text()
+        else:
+            text = _get_text(wt)
             if text.strip():
                 para_children.append(DocNode(type=NodeType.TEXT, content=text, html=text))
 
@@ -441,7 +483,7 @@ def _handle_word_paragraph(
 
 
 def _handle_list_item_para(
-    p_tag: Tag,
+    p_tag: HtmlElement,
     nodes: list[DocNode],
     level: int,
     inline_blocks: dict[str, str],
@@ -455,21 +497,19 @@ def _handle_list_item_para(
     Output format:  ``  - text`` (two spaces per nesting level beyond 1).
     """
     text_parts: list[str] = []
-    for child in p_tag.descendants:
-        if isinstance(child, NavigableString):
+    for child, parent in _iter_descendants(p_tag):
+        if isinstance(child, str):
             # Skip text inside Symbol-font spans (bullet glyphs like ·, o, §)
-            parent = child.parent
-            if isinstance(parent, Tag):
-                pstyle = parent.get("style", "").lower()
-                if "font-family:symbol" in pstyle.replace(" ", ""):
-                    continue
-                # Skip mso-spacerun spans (just list indentation noise)
-                if "mso-spacerun" in pstyle:
-                    continue
-            text = str(child).replace(_INDENT_MARKER, "").strip()
+            pstyle = parent.get("style", "").lower()
+            if "font-family:symbol" in pstyle.replace(" ", ""):
+                continue
+            # Skip mso-spacerun spans (just list indentation noise)
+            if "mso-spacerun" in pstyle:
+                continue
+            text = child.replace(_INDENT_MARKER, "").strip()
             if text:
                 text_parts.append(text)
-        elif isinstance(child, Tag) and child.name and child.name.lower() == "omml-inline":
+        elif child.tag == "omml-inline":
             # Inline math (e.g. h, p, f in "Ukuran objek (h) = 108,6 m")
             block_id = child.get("data-id", "")
             xml = inline_blocks.get(block_id, "")
@@ -481,11 +521,11 @@ def _handle_list_item_para(
     text = " ".join(text_parts).strip()
     # Collapse internal whitespace (including newlines from HTML source formatting)
     # to preserve paragraph as single block — similar to Pandoc --wrap=preserve intent.
-    text = re.sub(r'\s+', ' ', text)
+    text = _WS_RE.sub(' ', text)
     # Remove spaces around inline math inside parentheses: " ( $h$ ) " → " ($h$) "
-    text = re.sub(r'\(\s*(\$[^$]+\$)\s*\)', r'(\1)', text)
+    text = _PAREN_MATH_RE.sub(r'(\1)', text)
     # Strip leading bullet characters that survived (·, •, o, §, etc.)
-    text = re.sub(r'^[·•◦▪▫○●◉◌▸▹▶▷‣⁃§o]\s*', '', text)
+    text = _LEADING_BULLET_RE.sub('', text)
     if not text:
         return
 
@@ -493,7 +533,7 @@ def _handle_list_item_para(
     nodes.append(DocNode(type=NodeType.TEXT, content=f"{indent}- {text}", html=""))
 
 
-def _is_monospace_paragraph(p_tag: Tag) -> bool:
+def _is_monospace_paragraph(p_tag: HtmlElement) -> bool:
     """Return True if the *entire* paragraph is code/monospace content.
 
     Signals checked:
@@ -511,43 +551,36 @@ def _is_monospace_paragraph(p_tag: Tag) -> bool:
     p_style = p_tag.get("style", "").lower()
     if "mso-list" in p_style:
         return False
-    p_class = " ".join(
-        p_tag.get("class", [])
-        if isinstance(p_tag.get("class", []), list)
-        else p_tag.get("class", "").split()
-    )
-    if re.search(r'mso\w*list', p_class, re.IGNORECASE):
+    if _MSO_LIST_CLASS_RE.search(p_tag.get("class", "")):
         return False
 
     has_monospace_text = False
     has_non_monospace_text = False
     has_spacerun_indent = False
 
-    for child in p_tag.children:
-        if isinstance(child, NavigableString):
+    for child in _iter_children(p_tag):
+        if isinstance(child, str):
             # Bare text node directly inside <p> — non-monospace
-            if str(child).replace(_INDENT_MARKER, "").strip():
+            if child.replace(_INDENT_MARKER, "").strip():
                 has_non_monospace_text = True
             continue
-        if not isinstance(child, Tag):
-            continue
         style = child.get("style", "").lower()
 
         # mso-spacerun indent span
         if "mso-spacerun" in style:
-            text = child.get_text()
+            text = _get_text(child)
             cleaned = text.replace(_INDENT_MARKER, "").strip()
             if text and not cleaned:
                 has_spacerun_indent = True
             continue
 
         # Skip Word field / annotation tags that carry no visible text
-        if child.name and child.name.lower() in ("o:p", "w:bookmarkstart", "w:bookmarkend"):
+        if child.tag in _EMPTY_WORD_TAGS:
             continue
 
         # Check if this direct child span has a monospace font
         is_mono = "font-family" in style and any(f in style for f in _MONOSPACE_FONTS)
-        child_text = child.get_text().replace(_INDENT_MARKER, "").strip()
+        child_text = _get_text(child).replace(_INDENT_MARKER, "").strip()
         if not child_text:
             continue
         if is_mono:
@@ -560,10 +593,10 @@ def _is_monospace_paragraph(p_tag: Tag) -> bool:
     return has_monospace_text or has_spacerun_indent
 
 
-def _extract_code_line_text(p_tag: Tag) -> str:
+def _extract_code_line_text(p_tag: HtmlElement) -> str:
     """Extract one line of code text from a monospace paragraph.
 
-    Before BS4 parsing, _preserve_spacerun_indent replaced each space in
+    Before lxml parsing, _preserve_spacerun_indent replaced each space in
     mso-spacerun:yes spans with _INDENT_MARKER (\\ue000).  Here we count leading
     markers as the indentation depth (converting back to spaces), then collapse
     any remaining internal whitespace in the content.
@@ -571,7 +604,7 @@ def _extract_code_line_text(p_tag: Tag) -> str:
     If no markers are found (e.g. regex didn't match the multi-line span tag),
     we fall back to counting the actual leading spaces in the raw text.
     """
-    raw = p_tag.get_text().strip("\n\r")  # drop surrounding HTML newlines
+    raw = _get_text(p_tag).strip("\n\r")  # drop surrounding HTML newlines
     if not raw.strip(_INDENT_MARKER).strip():
         return ''
 
@@ -586,7 +619,7 @@ def _extract_code_line_text(p_tag: Tag) -> str:
         leading = len(raw) - len(inner)
 
     # Collapse remaining internal whitespace in the content
-    content = re.sub(r'\s+', ' ', inner.lstrip()).strip()
+    content = _WS_RE.sub(' ', inner.lstrip()).strip()
     return ' ' * leading + content
 
 
@@ -677,14 +710,16 @@ def _normalize_text(text: str) -> str:
     leading_spaces = leading_ws.replace('\t', '    ')
 
     # Collapse ALL internal whitespace (including newlines) to single spaces.
-    # _INDENT_MARKER (\ue000) is NOT whitespace so re.sub leaves it untouched;
+    # str.split() uses the same whitespace set as \s and runs in C, so this
+    # skips the regex engine for the many short runs in a document.
+    # _INDENT_MARKER (\ue000) is NOT whitespace so split() leaves it untouched;
     # convert it back to a real space AFTER collapsing so that runs of markers
     # (from mso-spacerun spans) are preserved as-is rather than merged.
-    content = re.sub(r'\s+', ' ', stripped).strip()
+    content = " ".join(stripped.split())
     return (leading_spaces + content).replace(_INDENT_MARKER, ' ')
 
 
-def _span_is_monospace(span: Tag) -> bool:
+def _span_is_monospace(span: HtmlElement) -> bool:
     """Return True if a <span> uses a monospace font (inline code candidate)."""
     style = span.get("style", "").lower()
     if "font-family" not in style:
@@ -693,22 +728,19 @@ def _span_is_monospace(span: Tag) -> bool:
 
 
 def _extract_inline(
-    parent: Tag,
+    parent: HtmlElement,
     out: list[DocNode],
     inline_blocks: dict[str, str],
 ) -> None:
     """Extract inline text and math placeholder nodes from a parent element."""
-    for child in parent.children:
-        if isinstance(child, NavigableString):
-            text = _normalize_text(str(child))
+    for child in _iter_children(parent):
+        if isinstance(child, str):
+            text = _normalize_text(child)
             if text:
                 out.append(DocNode(type=NodeType.TEXT, content=text, html=text))
             continue
 
-        if not isinstance(child, Tag):
-            continue
-
-        tag_name = child.name.lower() if child.name else ""
+        tag_name = child.tag
 
         if tag_name == "omml-inline":
             block_id = child.get("data-id", "")
@@ -716,14 +748,14 @@ def _extract_inline(
             if xml:
                 out.append(DocNode(type=NodeType.INLINE_MATH, omml_xml=xml))
         elif tag_name in _FORMATTING_TAGS:
-            text = _normalize_text(child.get_text())
+            text = _normalize_text(_get_text(child))
             if text:
-                out.append(DocNode(type=NodeType.TEXT, content=text, html=str(child)))
+                out.append(DocNode(type=NodeType.TEXT, content=text, html=_outer_html(child)))
         elif tag_name == "span" and _span_is_monospace(child):
             # Inline monospace span inside a normal paragraph → backtick code.
             # Use html="" so node_to_markdown returns content directly (no
             # re-parsing through html_to_markdown which doesn't know <code>).
-            text = _normalize_text(child.get_text())
+            text = _normalize_text(_get_text(child))
             if text:
                 out.append(DocNode(type=NodeType.TEXT, content=f"`{text}`", html=""))
         else:
@@ -733,27 +765,26 @@ def _extract_inline(
             if inner_nodes:
                 out.extend(inner_nodes)
             else:
-                text = _normalize_text(child.get_text())
+                text = _normalize_text(_get_text(child))
                 if text:
-                    out.append(DocNode(type=NodeType.TEXT, content=text, html=str(child)))
+                    out.append(DocNode(type=NodeType.TEXT, content=text, html=_outer_html(child)))
 
 
-def _li_text_with_code(element: Tag | NavigableString) -> str:
+def _li_text_with_code(element: HtmlElement) -> str:
     """Extract text from a list item element, wrapping Courier New spans in backticks."""
-    if isinstance(element, NavigableString):
-        return str(element)
-    if not isinstance(element, Tag) or not element.name:
-        return ""
-    tag = element.name.lower()
-    if tag in ("ul", "ol"):
+    tag = element.tag
+    if tag in _LIST_TAGS:
         return ""  # nested lists are handled separately by _list_to_md_lines
     if tag == "span" and _span_is_monospace(element):
-        text = element.get_text().strip()
+        text = _get_text(element).strip()
         return f"`{text}`" if text else ""
-    return "".join(_li_text_with_code(c) for c in element.children)
+    return "".join([
+        c if isinstance(c, str) else _li_text_with_code(c)
+        for c in _iter_children(element)
+    ])
 
 
-def _handle_list(list_tag: Tag, nodes: list[DocNode]) -> None:
+def _handle_list(list_tag: HtmlElement, nodes: list[DocNode]) -> None:
     """Convert a <ul>/<ol> element (with optional nested lists) to a TEXT node
     containing Markdown list syntax.  Nesting is rendered with 2-space indent
     per level so that renderers produce proper sub-lists.
@@ -763,7 +794,7 @@ def _handle_list(list_tag: Tag, nodes: list[DocNode]) -> None:
         nodes.append(DocNode(type=NodeType.TEXT, content="\n".join(lines), html=""))
 
 
-def _list_to_md_lines(list_tag: Tag, depth: int) -> list[str]:
+def _list_to_md_lines(list_tag: HtmlElement, depth: int) -> list[str]:
     """Recursively convert a <ul>/<ol> to Markdown list lines.
 
     Handles two structures:
@@ -771,26 +802,24 @@ def _list_to_md_lines(list_tag: Tag, depth: int) -> list[str]:
     - Word quirk: <ul><li>text</li><ul><li>sub</li></ul></ul>
       (nested <ul> is a sibling of <li>, not inside it)
     """
-    ordered = list_tag.name.lower() == "ol" if list_tag.name else False
+    ordered = list_tag.tag == "ol"
     lines: list[str] = []
     idx = 1
     indent = "  " * depth
 
-    for child in list_tag.children:
-        if not isinstance(child, Tag) or not child.name:
-            continue
-        child_name = child.name.lower()
+    for child in list_tag:
+        child_name = child.tag
 
         if child_name == "li":
             # Separate direct text/inline content from nested lists
             item_parts: list[str] = []
-            nested: list[Tag] = []
-            for node in child.children:
-                if isinstance(node, NavigableString):
-                    t = str(node).strip()
+            nested: list[HtmlElement] = []
+            for node in _iter_children(child):
+                if isinstance(node, str):
+                    t = node.strip()
                     if t:
                         item_parts.append(t)
-                elif isinstance(node, Tag) and node.name and node.name.lower() in ("ul", "ol"):
+                elif node.tag in _LIST_TAGS:
                     nested.append(node)
                 else:
                     t = _li_text_with_code(node)
@@ -798,7 +827,7 @@ def _list_to_md_lines(list_tag: Tag, depth: int) -> list[str]:
                         item_parts.append(t)
 
             # Collapse HTML source line-breaks and extra whitespace within item text
-            item_text = re.sub(r'\s+', ' ', " ".join(item_parts)).strip()
+            item_text = _WS_RE.sub(' ', " ".join(item_parts)).strip()
             prefix = f"{idx}." if ordered else "-"
             idx += 1
             lines.append(f"{indent}{prefix} {item_text}")
@@ -806,7 +835,7 @@ def _list_to_md_lines(list_tag: Tag, depth: int) -> list[str]:
             for sub_list in nested:
                 lines.extend(_list_to_md_lines(sub_list, depth + 1))
 
-        elif child_name in ("ul", "ol"):
+        elif child_name in _LIST_TAGS:
             # Word HTML quirk: nested list appears as direct child of outer list
             # (sibling of <li> rather than inside one). Attach at next depth.
             lines.extend(_list_to_md_lines(child, depth + 1))
@@ -815,7 +844,7 @@ def _list_to_md_lines(list_tag: Tag, depth: int) -> list[str]:
 
 
 def _handle_table(
-    table_tag: Tag,
+    table_tag: HtmlElement,
     nodes: list[DocNode],
     display_blocks: dict[str, str],
     inline_blocks: dict[str, str],
@@ -823,9 +852,9 @@ def _handle_table(
     """Process a <table> element into a TABLE DocNode."""
     rows: list[list[list[DocNode]]] = []
 
-    for tr in table_tag.find_all("tr"):
+    for tr in table_tag.iter("tr"):
         row_cells: list[list[DocNode]] = []
-        for cell in tr.find_all(["td", "th"]):
+        for cell in tr.iter("td", "th"):
             cell_nodes: list[DocNode] = []
             _extract_cell_content(cell, cell_nodes, display_blocks, inline_blocks)
             row_cells.append(cell_nodes)
@@ -837,19 +866,19 @@ def _handle_table(
 
 
 def _extract_cell_content(
-    cell_tag: Tag,
+    cell_tag: HtmlElement,
     out: list[DocNode],
     display_blocks: dict[str, str],
     inline_blocks: dict[str, str],
 ) -> None:
     """Extract content from a table cell (<td> or <th>)."""
     # Word wraps cell content in <p> tags — extract inline content from each.
-    paragraphs = cell_tag.find_all("p")
+    paragraphs = list(cell_tag.iter("p"))
     if paragraphs:
         for p in paragraphs:
             # Check for display math placeholder
-            display_placeholder = p.find("omml-display")
-            if display_placeholder:
+            display_placeholder = p.find(".//omml-display")
+            if display_placeholder is not None:
                 block_id = display_placeholder.get("data-id", "")
                 xml = display_blocks.get(block_id, "")
                 if xml:
@@ -4,16 +4,42 @@ from __future__ import annotations
 
 import re
 
+_ARRAY_RE = re.compile(r'\\begin\{array\}\{[^}]*\}\s*(.*?)\s*\\end\{array\}', re.DOTALL)
+# Runs of two or more directly nested \begin{aligned} / \end{aligned}
+_NESTED_BEGIN_RE = re.compile(r'(?:\\begin\{aligned\}\s*)+\\begin\{aligned\}')
+_NESTED_END_RE = re.compile(r'\\end\{aligned\}(?:\s*\\end\{aligned\})+')
+# A \\ line break with any surrounding whitespace
+_LINEBREAK_RE = re.compile(r'\s*\\\\\s*')
+# \mathbf{x}, or \mathbf{\mathbf{x}} when Pandoc doubles the wrapper
+_MATHBF_RE = re.compile(r'(\\mathbf\{)?\\mathbf\{(\w+)\}(?(1)\})')
+_LOG_SUB_GROUP_RE = re.compile(r'(\\log)\\\s*_\{')
+_LOG_SUB_CHAR_RE = re.compile(r'(\\log)\\\s*_(\w)')
+_MULTI_SPACE_RE = re.compile(r'  +')
+# Anything _fix_whitespace would change: double spaces, a \\ break, a line
+# break (same set as str.splitlines) or trailing whitespace.
+_WHITESPACE_WORK_RE = re.compile(
+    r'  |\\\\|[\n\r\v\f\x1c-\x1e\x85\u2028\u2029]|\s\Z'
+)
+_NUM_UNIT_RE = re.compile(r'(\d)\s*(\\text\{)')
+_EMPTY_TEXT_RE = re.compile(r'\\text\{\s*\}')
+_LEFT_SPACE_RE = re.compile(r'\\left\s+')
+_RIGHT_SPACE_RE = re.compile(r'\\right\s+')
+_NON_SPACE_RE = re.compile(r'\S')
+_BRACE_RE = re.compile(r'[{}]')
+
 
 def postprocess_latex(latex: str) -> str:
     """Clean up LaTeX math output from Pandoc."""
+    # Every pass but the whitespace one needs a command or a group to act on
+    if '\\' not in latex and '{' not in latex:
+        return _fix_whitespace(latex).strip()
     latex = _unwrap_multiline_groups(latex)
     latex = _unwrap_array_in_aligned(latex)
     latex = _collapse_nested_aligned(latex)
+    latex = _fix_whitespace(latex)
     latex = _add_alignment_markers(latex)
     latex = _fix_bold_math_vars(latex)
     latex = _fix_log_subscript(latex)
-    latex = _fix_whitespace(latex)
     latex = _fix_common_pandoc_quirks(latex)
     latex = _fix_number_unit_spacing(latex)
     return latex.strip()
@@ -39,13 +65,23 @@ def _unwrap_multiline_groups(latex: str) -> str:
     - Command arguments: groups appear after a command like \frac and
       are typically short (single chars/expressions).
     """
-    # Split into top-level brace groups.  Walk the string tracking brace
-    # depth so we don't confuse \frac{a}{b} with multiline groups.
-    groups: list[str] = []
+    # Fewer than two opening braces can't form two groups, and a string of
+    # groups must start with '{' and end with '}' (ignoring whitespace).
+    if latex.count('{') < 2:
+        return latex
+    first = _NON_SPACE_RE.search(latex)
+    if latex[first.start()] != '{' or latex.rstrip()[-1] != '}':
+        return latex
+
+    # Split into top-level brace groups.  Walk the braces tracking depth so
+    # we don't confuse \frac{a}{b} with multiline groups; the regex skips
+    # everything in between.
+    spans: list[tuple[int, int]] = []
     depth = 0
     start = -1
 
-    for i, ch in enumerate(latex):
+    for m in _BRACE_RE.finditer(latex):
+        i, ch = m.start(), m.group()
         if ch == '{' and depth == 0:
             start = i
             depth = 1
@@ -54,34 +90,29 @@ def _unwrap_multiline_groups(latex: str) -> str:
         elif ch == '}' and depth > 0:
             depth -= 1
             if depth == 0 and start >= 0:
-                groups.append((start, i, latex[start + 1:i]))
+                spans.append((start, i))
                 start = -1
 
-    if len(groups) < 2:
+    if len(spans) < 2:
         return latex
 
-    # Verify no non-whitespace content between consecutive groups
-    is_consecutive = True
-    for j in range(len(groups) - 1):
-        between = latex[groups[j][1] + 1:groups[j + 1][0]]
-        if between.strip():
-            is_consecutive = False
-            break
-
-    if not is_consecutive:
+    # Only whitespace may appear before, between and after the groups.
+    # Search in place rather than slicing out each gap.
+    if _NON_SPACE_RE.search(latex, 0, spans[0][0]):
         return latex
-
-    # Check that content before first group and after last is just whitespace
-    before = latex[:groups[0][0]].strip()
-    after = latex[groups[-1][1] + 1:].strip()
-    if before or after:
+    for (_, end), (next_start, _) in zip(spans, spans[1:]):
+        if _NON_SPACE_RE.search(latex, end + 1, next_start):
+            return latex
+    if _NON_SPACE_RE.search(latex, spans[-1][1] + 1):
         return latex
 
+    groups = [latex[start + 1:end] for start, end in spans]
+
     # Heuristic to distinguish multiline equations from \frac{a}{b}-style args:
     # - If any groups contain newlines → multiline (original Pandoc behavior)
     # - If 3+ groups → multiline (e.g. 4-line equation system)
     # - If 2 groups, each with substantial content (>5 chars) → multiline
-    newline_groups = sum(1 for _, _, c in groups if '\n' in c)
+    newline_groups = sum(1 for c in groups if '\n' in c)
     if newline_groups >= 1:
         pass  # definitely multiline
     elif len(groups) >= 3:
@@ -89,7 +120,7 @@ def _unwrap_multiline_groups(latex: str) -> str:
     elif len(groups) == 2:
         # 2 groups: only multiline if both have substantial content
         # (rules out \frac{a}{b} or _{10} style)
-        contents = [c.strip() for _, _, c in groups]
+        contents = [c.strip() for c in groups]
         if all(len(c) > 5 for c in contents):
             pass  # substantial content in both
         else:
@@ -98,7 +129,7 @@ def _unwrap_multiline_groups(latex: str) -> str:
         return latex
 
     # Extract and join the lines
-    lines = [content.strip() for _, _, content in groups]
+    lines = [content.strip() for content in groups]
     return ' \\\\\n'.join(lines)
 
 
@@ -115,13 +146,9 @@ def _unwrap_array_in_aligned(latex: str) -> str:
       line1 \\
       line2
     """
-    latex = re.sub(
-        r'\\begin\{array\}\{[^}]*\}\s*(.*?)\s*\\end\{array\}',
-        r'\1',
-        latex,
-        flags=re.DOTALL,
-    )
-    return latex
+    if '\\begin{array}' not in latex:
+        return latex
+    return _ARRAY_RE.sub(r'\1', latex)
 
 
 def _collapse_nested_aligned(latex: str) -> str:
@@ -130,21 +157,18 @@ def _collapse_nested_aligned(latex: str) -> str:
     Pandoc sometimes produces:
       \begin{aligned} \begin{aligned} ... \end{aligned} \end{aligned}
     """
-    pattern = r'\\begin\{aligned\}\s*\\begin\{aligned\}'
-    while re.search(pattern, latex):
-        latex = re.sub(pattern, r'\\begin{aligned}', latex)
-        latex = re.sub(
-            r'\\end\{aligned\}\s*\\end\{aligned\}',
-            r'\\end{aligned}',
-            latex,
-        )
+    if latex.count('\\begin{aligned}') < 2:
+        return latex
+    latex, nested = _NESTED_BEGIN_RE.subn(r'\\begin{aligned}', latex)
+    if nested:
+        latex = _NESTED_END_RE.sub(r'\\end{aligned}', latex)
     return latex
 
 
 # Relation operators for alignment, ordered by specificity.
 # LaTeX commands use negative lookahead to avoid matching prefixes
 # (e.g. \le inside \left).
-_RELATION_OPS = [
+_RELATION_OPS = (
     r'\\approx(?![a-zA-Z])', r'\\simeq(?![a-zA-Z])', r'\\cong(?![a-zA-Z])',
     r'\\equiv(?![a-zA-Z])', r'\\sim(?![a-zA-Z])',
     r'\\propto(?![a-zA-Z])', r'\\doteq(?![a-zA-Z])',
@@ -158,7 +182,8 @@ _RELATION_OPS = [
     r'=',
     r'(?<!\\)<(?![a-zA-Z])',
     r'(?<!\\)>(?![a-zA-Z])',
-]
+)
+_RELATION_RE = re.compile('|'.join(_RELATION_OPS))
 
 
 def _add_alignment_markers(latex: str) -> str:
@@ -169,20 +194,16 @@ def _add_alignment_markers(latex: str) -> str:
 
     Input:  m - M = -5 + 5\log_{10}d \\  M = m + 5
     Output: m - M &= -5 + 5\log_{10}d \\  M &= m + 5
+
+    Expects _fix_whitespace to have run, so every row break is exactly
+    ' \\' followed by a newline.
     """
     # Only process multiline content (has \\)
     if '\\\\' not in latex:
         return latex
 
-    lines = re.split(r'\s*\\\\\s*', latex)
-    if len(lines) < 2:
-        return latex
-
-    aligned_lines = []
-    for line in lines:
-        aligned_lines.append(_insert_alignment(line))
-
-    return ' \\\\\n'.join(aligned_lines)
+    lines = latex.split(' \\\\\n')
+    return ' \\\\\n'.join([_insert_alignment(line) for line in lines])
 
 
 def _insert_alignment(line: str) -> str:
@@ -191,30 +212,18 @@ def _insert_alignment(line: str) -> str:
     if '&' in line:
         return line
 
-    best_pos = len(line) + 1
-    best_match = None
-
-    for op_pattern in _RELATION_OPS:
-        for m in re.finditer(op_pattern, line):
-            pos = m.start()
-
-            # Check brace depth at this position — skip if inside braces
-            depth = 0
-            for ch in line[:pos]:
-                if ch == '{':
-                    depth += 1
-                elif ch == '}':
-                    depth -= 1
-            if depth > 0:
-                continue
-
-            if pos < best_pos:
-                best_pos = pos
-                best_match = m
-            break  # first match per operator is enough
-
-    if best_match is not None:
-        pos = best_match.start()
+    # Matches come back left to right, so the first one outside braces wins.
+    # Brace depth is carried forward from the previous match, counting only
+    # the span in between.
+    depth = 0
+    scanned = 0
+    for m in _RELATION_RE.finditer(line):
+        pos = m.start()
+        depth += line.count('{', scanned, pos) - line.count('}', scanned, pos)
+        scanned = pos
+        if depth > 0:
+            continue
+
         return line[:pos] + '&' + line[pos:]
 
     return line
@@ -227,11 +236,10 @@ def _fix_bold_math_vars(latex: str) -> str:
     which Pandoc translates to \mathbf{}. In standard math notation these
     should just be plain (italic) variables.
     """
-    # \mathbf{x} where x is a single letter → just x
-    latex = re.sub(r'\\mathbf\{(\w)\}', r'\1', latex)
-    # \mathbf{text} for short identifiers — also unwrap
-    latex = re.sub(r'\\mathbf\{(\w+)\}', r'\1', latex)
-    return latex
+    if '\\mathbf{' not in latex:
+        return latex
+    # \mathbf{x} and \mathbf{text} for short identifiers → just the text
+    return _MATHBF_RE.sub(r'\2', latex)
 
 
 def _fix_log_subscript(latex: str) -> str:
@@ -240,21 +248,26 @@ def _fix_log_subscript(latex: str) -> str:
     Pandoc inserts an extra \ (backslash-space) before the subscript of
     function names like log.
     """
+    if '\\log\\' not in latex:
+        return latex
     # \log\ _{10} → \log_{10}
-    latex = re.sub(r'(\\log)\\\s*_\{', r'\1_{', latex)
+    latex = _LOG_SUB_GROUP_RE.sub(r'\1_{', latex)
     # Also handle: \log\ _{10} without braces (less common)
-    latex = re.sub(r'(\\log)\\\s*_(\w)', r'\1_{\2}', latex)
+    latex = _LOG_SUB_CHAR_RE.sub(r'\1_{\2}', latex)
     return latex
 
 
 def _fix_whitespace(latex: str) -> str:
     """Normalize whitespace in LaTeX output."""
+    # Single-line math with clean spacing (the common case) is left as is
+    if not _WHITESPACE_WORK_RE.search(latex):
+        return latex
     # Collapse multiple spaces
-    latex = re.sub(r'  +', ' ', latex)
+    latex = _MULTI_SPACE_RE.sub(' ', latex)
     # Ensure line breaks in aligned environments are clean
-    latex = re.sub(r'\s*\\\\\s*', ' \\\\\\\\\n', latex)
+    latex = _LINEBREAK_RE.sub(' \\\\\\\\\n', latex)
     # Remove trailing whitespace on lines
-    latex = '\n'.join(line.rstrip() for line in latex.splitlines())
+    latex = '\n'.join([line.rstrip() for line in latex.splitlines()])
     return latex
 
 
@@ -271,22 +284,27 @@ def _fix_number_unit_spacing(latex: str) -> str:
     ``\text{``.  It does *not* touch letter-to-\text patterns (e.g. ``x\text{th}``)
     because those are usually ordinal suffixes that need no space.
     """
-    return re.sub(r'(\d)\s*(\\text\{)', r'\1\\,\2', latex)
+    if '\\text{' not in latex:
+        return latex
+    return _NUM_UNIT_RE.sub(r'\1\\,\2', latex)
 
 
 def _fix_common_pandoc_quirks(latex: str) -> str:
     """Fix known Pandoc conversion artifacts."""
     # \text{ } (just a space) should be removed
-    latex = re.sub(r'\\text\{\s*\}', ' ', latex)
+    if '\\text{' in latex:
+        latex = _EMPTY_TEXT_RE.sub(' ', latex)
 
     # Fix double backslash spacing
-    latex = re.sub(r'\\\\\\\\', r'\\\\', latex)
+    latex = latex.replace('\\\\\\\\', '\\\\')
 
     # Remove empty groups
-    latex = re.sub(r'\{\}', '', latex)
+    latex = latex.replace('{}', '')
 
     # Fix \left and \right spacing
-    latex = re.sub(r'\\left\s+', r'\\left', latex)
-    latex = re.sub(r'\\right\s+', r'\\right', latex)
+    if '\\left' in latex:
+        latex = _LEFT_SPACE_RE.sub(r'\\left', latex)
+    if '\\right' in latex:
+        latex = _RIGHT_SPACE_RE.sub(r'\\right', latex)
 
     return latex
@@ -4,6 +4,7 @@ from __future__ import annotations
 
 import json
 import sqlite3
+import threading
 from pathlib import Path
 
 DB_PATH = Path(__file__).parent / "history.db"
@@ -16,10 +17,25 @@ DEFAULTS = {
     "lmstudio_model": "local-model",
 }
 
+# Set once the table exists and defaults are seeded, so reads and writes
+# don't re-run CREATE TABLE / INSERT OR IGNORE on every call.
+_initialized = False
+_init_lock = threading.Lock()
+
+
+# One connection per thread, opened lazily and kept for the thread's lifetime
+# (same scheme as history.py, which shares this database file).
+_local = threading.local()
+
 
 def _connect() -> sqlite3.Connection:
-    conn = sqlite3.connect(str(DB_PATH))
-    conn.row_factory = sqlite3.Row
+    """Return this thread's connection. ``with conn:`` scopes a transaction."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(str(DB_PATH))
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
     return conn
 
 
@@ -39,14 +55,20 @@ def _ensure_settings_table(conn: sqlite3.Connection) -> None:
 
 def init_settings() -> None:
     """Ensure settings table exists. Call at app startup."""
-    with _connect() as conn:
-        _ensure_settings_table(conn)
+    global _initialized
+    with _init_lock:
+        if _initialized:
+            return
+        with _connect() as conn:
+            _ensure_settings_table(conn)
+        _initialized = True
 
 
 def get_all() -> dict:
     """Return all settings as a flat dict."""
+    if not _initialized:
+        init_settings()
     with _connect() as conn:
-        _ensure_settings_table(conn)
         rows = conn.execute("SELECT key, value FROM settings").fetchall()
     result = dict(DEFAULTS)
     for row in rows:
@@ -60,13 +82,23 @@ def get_all() -> dict:
 
 def get(key: str) -> str | None:
     """Get a single setting value."""
-    return get_all().get(key)
+    if not _initialized:
+        init_settings()
+    with _connect() as conn:
+        row = conn.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        return DEFAULTS.get(key)
+    try:
+        return json.loads(row["value"])
+    except (json.JSONDecodeError, TypeError):
+        return row["value"]
 
 
 def set_many(updates: dict) -> None:
     """Update multiple settings."""
+    if not _initialized:
+        init_settings()
     with _connect() as conn:
-        _ensure_settings_table(conn)
         for key, val in updates.items():
             if key not in DEFAULTS:
                 continue
@@ -8,7 +8,11 @@ import pytest
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+import converter
+import math_cache
 from converter import convert_html
+from math_cache import clear_math_cache
+from parser import DocNode, NodeType, parse_clipboard_html
 
 FIXTURES = Path(__file__).parent / "fixtures"
 
@@ -122,3 +126,95 @@ def test_response_shape():
     assert "html" in result
     assert "warnings" in result
     assert isinstance(result["warnings"], list)
+
+
+@pytest.fixture
+def fresh_math_cache():
+    clear_math_cache()
+    yield
+    clear_math_cache()
+
+
+def test_math_conversion_is_memoized(monkeypatch, fresh_math_cache):
+    calls = []
+
+    def fake_omml_to_latex(xml):
+        calls.append(xml)
+        return "x^{2}", True
+
+    monkeypatch.setattr(math_cache, "try_omml_to_latex", fake_omml_to_latex)
+    xml = "<m:oMath><m:r><m:t>x</m:t></m:r></m:oMath>"
+    for _ in range(3):
+        warnings: list[str] = []
+        node = DocNode(type=NodeType.INLINE_MATH, omml_xml=xml)
+        assert converter._convert_math(node, warnings) == "x^{2}"
+        assert warnings == []
+    assert len(calls) == 1
+
+
+def test_pandoc_failure_is_not_cached(monkeypatch, fresh_math_cache):
+    outputs = [None, "$\\frac{a}{b}$"]
+    calls = []
+
+    def flaky_docx_to_latex(docx_bytes):
+        calls.append(docx_bytes)
+        return outputs[len(calls) - 1]
+
+    monkeypatch.setattr("omml_to_latex._docx_to_latex", flaky_docx_to_latex)
+    xml = (
+        "<m:oMath><m:f><m:num><m:r><m:t>a</m:t></m:r></m:num>"
+        "<m:den><m:r><m:t>b</m:t></m:r></m:den></m:f></m:oMath>"
+    )
+    assert math_cache.cached_math(xml) == "ab"  # plain-text fallback
+    assert math_cache.cached_math(xml) == "\\frac{a}{b}"
+    assert math_cache.cached_math(xml) == "\\frac{a}{b}"
+    assert len(calls) == 2
+
+
+def test_document_math_is_batched(monkeypatch, fresh_math_cache):
+    batches = []
+
+    def fake_batch(xmls):
+        batches.append(list(xmls))
+        return [(f"e_{{{i}}}", True) for i in range(len(xmls))]
+
+    def fail_single(xml):
+        raise AssertionError("equation should come from the batch")
+
+    monkeypatch.setattr(converter, "try_omml_batch_to_latex", fake_batch)
+    monkeypatch.setattr(math_cache, "try_omml_to_latex", fail_single)
+    a, b, c = (f"<m:oMath><m:r><m:t>{v}</m:t></m:r></m:oMath>" for v in "abc")
+    nodes = [
+        DocNode(type=NodeType.PARAGRAPH, children=[
+            DocNode(type=NodeType.INLINE_MATH, omml_xml=a),
+            DocNode(type=NodeType.INLINE_MATH, omml_xml=b),
+        ]),
+        DocNode(type=NodeType.DISPLAY_MATH, omml_xml=a),
+        DocNode(type=NodeType.TABLE, table_rows=[[[
+            DocNode(type=NodeType.INLINE_MATH, omml_xml=c),
+        ]]]),
+    ]
+    converter._prefetch_math(nodes)
+    assert batches == [[a, b, c]]
+    warnings: list[str] = []
+    for xml, expected in ((a, "e_{0}"), (b, "e_{1}"), (c, "e_{2}")):
+        node = DocNode(type=NodeType.INLINE_MATH, omml_xml=xml)
+        assert converter._convert_math(node, warnings) == expected
+    assert warnings == []
+
+
+def test_list_item_math_uses_math_cache(monkeypatch, fresh_math_cache):
+    calls = []
+
+    def fake_omml_to_latex(xml):
+        calls.append(xml)
+        return "h", True
+
+    monkeypatch.setattr(math_cache, "try_omml_to_latex", fake_omml_to_latex)
+    item = (
+        '<p class=MsoListParagraph style="mso-list:l0 level1">'
+        'Tinggi (<m:oMath><m:r>h</m:r></m:oMath>)</p>'
+    )
+    nodes = parse_clipboard_html(f"<html><body>{item}{item}</body></html>")
+    assert [n.content for n in nodes] == ["- Tinggi ($h$)", "- Tinggi ($h$)"]
+    assert len(calls) == 1
@@ -8,7 +8,7 @@ import pytest
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from omml_to_latex import omml_to_latex, _strip_math_delimiters, _fallback_text_extract
+from omml_to_latex import omml_to_latex, _strip_math_delimiters, _fallback_text_extract, _plain_run_latex
 
 FIXTURES = Path(__file__).parent / "fixtures"
 
@@ -45,6 +45,15 @@ def test_fallback_text_extract():
     assert _fallback_text_extract(xml) == "hello"
 
 
+def test_plain_runs_skip_pandoc():
+    assert omml_to_latex("<m:oMath><m:r>x</m:r></m:oMath>") == "x"
+    assert omml_to_latex("<m:oMath><m:r><m:t>12</m:t></m:r></m:oMath>") == "12"
+    # Multi-letter and styled runs still go through Pandoc
+    assert _plain_run_latex("<m:oMath><m:r><m:t>ab</m:t></m:r></m:oMath>") is None
+    styled = '<m:oMath><m:r><m:rPr><m:sty m:val="p"/></m:rPr><m:t>d</m:t></m:r></m:oMath>'
+    assert _plain_run_latex(styled) is None
+
+
 def test_clipboard_omml_with_html_tags():
     """Clipboard OMML has HTML tags (<font>, <span>, <i>, <br>) mixed in."""
     omml = (FIXTURES / "clipboard_omml_with_html.xml").read_text(encoding="utf-8")
@@ -87,6 +87,20 @@ def test_parse_conditional_comments():
     assert any("bintang" in n.content for n in text_nodes)
 
 
+def test_parse_skips_html_comments():
+    html = "<html><body><!--StartFragment--><p>a <!-- note --> b</p><!--EndFragment--></body></html>"
+    nodes = parse_clipboard_html(html)
+    text = "".join(n.content for n in _flatten(nodes) if n.type == NodeType.TEXT)
+    assert "note" not in text
+    assert "Fragment" not in text
+    assert "a" in text and "b" in text
+
+
+def test_parse_empty_html():
+    assert parse_clipboard_html("") == []
+    assert parse_clipboard_html("   ") == []
+
+
 def _flatten(nodes: list[DocNode]) -> list[DocNode]:
     """Flatten nested node tree."""
     result = []
@@ -0,0 +1,39 @@
+"""Tests for LaTeX post-processing of Pandoc output."""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from postprocess import postprocess_latex
+
+
+def test_multiline_groups_are_aligned():
+    latex = "{m - M = -5 + 5\\log\\ _{10}d\n}{M = m + 5}"
+    assert postprocess_latex(latex) == "m - M &= -5 + 5\\log_{10}d \\\\\nM &= m + 5"
+
+
+def test_alignment_skips_operators_inside_braces():
+    latex = "f_{x=0} \\le y \\\\ z = 1"
+    assert postprocess_latex(latex) == "f_{x=0} &\\le y \\\\\nz &= 1"
+
+
+def test_frac_arguments_are_not_split():
+    assert postprocess_latex("\\frac{a}{b}") == "\\frac{a}{b}"
+
+
+def test_nested_aligned_collapsed():
+    latex = "\\begin{aligned} \\begin{aligned} a \\end{aligned} \\end{aligned}"
+    assert postprocess_latex(latex) == "\\begin{aligned} a \\end{aligned}"
+
+
+def test_bold_vars_unwrapped():
+    assert postprocess_latex("\\mathbf{x} + \\mathbf{\\mathbf{y}}") == "x + y"
+
+
+def test_number_unit_spacing():
+    assert postprocess_latex("5407 \\text{Å}") == "5407\\,\\text{Å}"
+
+
+def test_plain_text_whitespace_only():
+    assert postprocess_latex("  a  b \n c ") == "a b\n c"
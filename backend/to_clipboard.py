@@ -48,11 +48,17 @@ All offsets are UTF-8 byte positions from the very start of the blob.
 
 from __future__ import annotations
 
+import hashlib
 import re
+import shutil
 import subprocess
+import threading
+from collections import OrderedDict
 
 import win32clipboard
 
+import pandoc_server
+
 CF_HTML_FORMAT = win32clipboard.RegisterClipboardFormat("HTML Format")
 
 # Pandoc input format strings for each supported source format.
@@ -74,120 +80,224 @@ _PANDOC_INPUT: dict[str, str] = {
 #   Input:  1\quad\text{m}        →  1\text{~m}
 #   Input:  \text{ AU}            →  \text{~AU}
 
-_SPACE_BEFORE_TEXT_RE = re.compile(
+# Either spacing commands followed by \text{...} (group 1 is the argument)
+# or a bare \text{ with a leading space; both are rewritten in one scan.
+_MATH_SPACING_RE = re.compile(
     r'(?:(?:\\[ ,;:>]|\\(?:quad|qquad|enspace|thinspace|medspace|thickspace))\s*)+'
     r'\\text\{([^}]*)\}'
+    r'|\\text\{ '
+)
+# $$display$$ (may span lines) or $inline$ (single line, not part of $$).
+# Both branches start with a literal '$' so the engine can skip ahead to the
+# next '$' instead of trying a match at every position.
+_MATH_SPAN_RE = re.compile(
+    r'\$\$([^$]*(?:\$(?!\$)[^$]*)*)\$\$'
+    r'|\$(?<!\$\$)(?!\$)(.*?)(?<!\$)\$(?!\$)'
 )
-_LEADING_SPACE_IN_TEXT_RE = re.compile(r'\\text\{ ')
-_DISPLAY_MATH_RE = re.compile(r'\$\$(.*?)\$\$', re.DOTALL)
-_INLINE_MATH_RE = re.compile(r'(?<!\$)\$(?!\$)(.*?)(?<!\$)\$(?!\$)')
 
-_PRE_TAG_RE  = re.compile(r'<pre\b([^>]*?)>', re.IGNORECASE)
-_CODE_TAG_RE = re.compile(r'<code\b([^>]*?)>', re.IGNORECASE)
+# Pandoc's HTML stays UTF-8 bytes all the way to the clipboard, so the tag
+# patterns and styles are bytes too.
+_PRE_TAG_RE  = re.compile(rb'<pre\b([^>]*?)>', re.IGNORECASE)
+_CODE_TAG_RE = re.compile(rb'<code\b([^>]*?)>', re.IGNORECASE)
 
 _PRE_STYLE = (
-    "font-family: Consolas, 'Courier New', monospace; "
-    "font-size: 9pt; "
-    "background-color: #f5f5f5; "
-    "padding: 6pt; "
-    "border: 0.5pt solid #cccccc; "
-    "margin: 6pt 0; "
-    "white-space: pre-wrap;"
+    b"font-family: Consolas, 'Courier New', monospace; "
+    b"font-size: 9pt; "
+    b"background-color: #f5f5f5; "
+    b"padding: 6pt; "
+    b"border: 0.5pt solid #cccccc; "
+    b"margin: 6pt 0; "
+    b"white-space: pre-wrap;"
 )
-_CODE_STYLE = "font-family: Consolas, 'Courier New', monospace; font-size: 9pt;"
+_CODE_STYLE = b"font-family: Consolas, 'Courier New', monospace; font-size: 9pt;"
 
 
-def _apply_word_html_styles(html: str) -> str:
+def _apply_word_html_styles(html: bytes) -> bytes:
     """Inject inline monospace styles into <pre>/<code> so Word renders code blocks correctly."""
-    html = _PRE_TAG_RE.sub(
-        lambda m: f'<pre{m.group(1)} style="{_PRE_STYLE}">',
-        html,
-    )
-    html = _CODE_TAG_RE.sub(
-        lambda m: f'<code{m.group(1)} style="{_CODE_STYLE}">',
-        html,
-    )
+    html = _PRE_TAG_RE.sub(rb'<pre\1 style="' + _PRE_STYLE + b'">', html)
+    html = _CODE_TAG_RE.sub(rb'<code\1 style="' + _CODE_STYLE + b'">', html)
     return html
 
 
 def _fix_math_spacing(math: str) -> str:
     """Replace spacing commands before \\text{} with ~ inside \\text{}."""
-    math = _SPACE_BEFORE_TEXT_RE.sub(
-        lambda m: r'\text{~' + m.group(1).lstrip() + '}',
-        math,
-    )
-    math = _LEADING_SPACE_IN_TEXT_RE.sub(r'\\text{~', math)
-    return math
+    return _MATH_SPACING_RE.sub(_replace_math_spacing, math)
+
+
+def _replace_math_spacing(m: re.Match) -> str:
+    arg = m.group(1)
+    if arg is None:
+        return r'\text{~'
+    # The argument may itself hold a \text{ (no closing brace in between)
+    return r'\text{~' + arg.lstrip().replace(r'\text{ ', r'\text{~') + '}'
 
 
 def _preprocess_math_spacing(text: str, fmt: str) -> str:
     """Apply spacing fix to all math spans in *text*."""
+    # Both rewrites need a \text{} argument; plain prose skips the regexes
+    if '\\text{' not in text:
+        return text
     if fmt == 'latex':
         return _fix_math_spacing(text)
-    # Markdown: apply inside $$...$$ first, then $...$
-    text = _DISPLAY_MATH_RE.sub(
-        lambda m: '$$' + _fix_math_spacing(m.group(1)) + '$$', text
-    )
-    text = _INLINE_MATH_RE.sub(
-        lambda m: '$' + _fix_math_spacing(m.group(1)) + '$', text
-    )
-    return text
+    # Markdown: fix $$...$$ and $...$ spans in a single scan
+    if '$' not in text:
+        return text
+    return _MATH_SPAN_RE.sub(_fix_math_span, text)
+
+
+def _fix_math_span(m: re.Match) -> str:
+    # Most spans have no \text{} to fix; leave them without running the regex
+    if '\\text{' not in m.group():
+        return m.group()
+    if m.group(1) is not None:
+        return '$$' + _fix_math_spacing(m.group(1)) + '$$'
+    return '$' + _fix_math_spacing(m.group(2)) + '$'
 
 
 # ── Pandoc helpers ────────────────────────────────────────────────────────────
 
-def _pandoc(text: str, from_fmt: str, to_fmt: str, extra_args: list[str]) -> str:
-    """Call Pandoc and return stdout as a string.
+# Resolved once so each conversion skips the PATH search; None when Pandoc
+# isn't installed (conversions then fail up front with an install hint).
+_PANDOC_EXE = shutil.which("pandoc")
+# Keep Windows from attaching a console window to each Pandoc run
+_NO_WINDOW = getattr(subprocess, "CREATE_NO_WINDOW", 0)
+
+
+def _pandoc(
+    text: str,
+    from_fmt: str,
+    to_fmt: str,
+    extra_args: list[str],
+    server_options: dict[str, object],
+) -> bytes:
+    """Call Pandoc and return its UTF-8 output as bytes.
+
+    Uses the resident ``pandoc server`` when available, with
+    *server_options* as its JSON fields; otherwise runs the ``pandoc`` CLI
+    with *extra_args*.
+
+    Expects ``_PANDOC_EXE`` to be resolved.
 
     Raises
     ------
-    FileNotFoundError
-        When Pandoc is not on PATH.
     RuntimeError
         When Pandoc exits with a non-zero return code.
     """
-    cmd = ["pandoc", "-f", from_fmt, "-t", to_fmt, *extra_args]
+    out = pandoc_server.convert(text, from_fmt, to_fmt, _PANDOC_EXE, **server_options)
+    if out is not None:
+        return out
+
+    cmd = [_PANDOC_EXE, "-f", from_fmt, "-t", to_fmt, *extra_args]
     result = subprocess.run(
         cmd,
         input=text.encode("utf-8"),
         capture_output=True,
         timeout=30,
+        creationflags=_NO_WINDOW,
     )
     if result.returncode != 0:
         stderr = result.stderr.decode("utf-8", errors="replace").strip()
         raise RuntimeError(stderr or f"pandoc exited with code {result.returncode}")
-    return result.stdout.decode("utf-8", errors="replace")
+    return result.stdout
 
 
 # ── CF_HTML builder ───────────────────────────────────────────────────────────
 
 _CF_HTML_HEADER_TEMPLATE = (
-    "Version:0.9\r\n"
-    "StartHTML:{sh:09d}\r\n"
-    "EndHTML:{eh:09d}\r\n"
-    "StartFragment:{sf:09d}\r\n"
-    "EndFragment:{ef:09d}\r\n"
+    b"Version:0.9\r\n"
+    b"StartHTML:%09d\r\n"
+    b"EndHTML:%09d\r\n"
+    b"StartFragment:%09d\r\n"
+    b"EndFragment:%09d\r\n"
 )
 
 _OPEN_TAG = b"<html><body><!--StartFragment-->"
 _CLOSE_TAG = b"<!--EndFragment--></body></html>"
 
+# All offsets are zero-padded to 9 digits, so the header length is fixed and
+# StartHTML / StartFragment never change.
+_CF_HTML_HEADER_LEN = len(_CF_HTML_HEADER_TEMPLATE % (0, 0, 0, 0))
+_CF_HTML_START_FRAGMENT = _CF_HTML_HEADER_LEN + len(_OPEN_TAG)
+_CLOSE_TAG_LEN = len(_CLOSE_TAG)
 
-def _make_cf_html(fragment: str) -> bytes:
-    """Wrap an HTML fragment in a properly-headered CF_HTML clipboard blob."""
-    # Compute header length with zeroed offsets (all offsets are 9 digits = same byte length)
-    dummy_header = _CF_HTML_HEADER_TEMPLATE.format(sh=0, eh=0, sf=0, ef=0)
-    header_len = len(dummy_header.encode("utf-8"))
-
-    frag_bytes = fragment.encode("utf-8")
 
-    sh = header_len
-    sf = sh + len(_OPEN_TAG)
+def _make_cf_html(frag_bytes: bytes) -> bytes:
+    """Wrap a UTF-8 HTML fragment in a properly-headered CF_HTML clipboard blob."""
+    sh = _CF_HTML_HEADER_LEN
+    sf = _CF_HTML_START_FRAGMENT
     ef = sf + len(frag_bytes)
-    eh = ef + len(_CLOSE_TAG)
+    eh = ef + _CLOSE_TAG_LEN
 
-    header = _CF_HTML_HEADER_TEMPLATE.format(sh=sh, eh=eh, sf=sf, ef=ef)
-    return header.encode("utf-8") + _OPEN_TAG + frag_bytes + _CLOSE_TAG
+    header = _CF_HTML_HEADER_TEMPLATE % (sh, eh, sf, ef)
+    return b"".join((header, _OPEN_TAG, frag_bytes, _CLOSE_TAG))
+
+
+# ── Conversion cache ──────────────────────────────────────────────────────────
+#
+# Pasting the same text again (common while editing) would otherwise spawn
+# Pandoc again for an identical result.  Finished CF_HTML blobs are kept in a
+# small LRU keyed on a digest of the source, so large documents aren't held
+# twice in memory.  The LRU is bounded by entry count and by total size.
+
+_CF_HTML_CACHE_SIZE = 32
+_CF_HTML_CACHE_MAX_BYTES = 32 * 1024 * 1024
+_cf_html_cache: OrderedDict[tuple[bytes, str], bytes] = OrderedDict()
+_cf_html_cache_bytes = 0
+_cf_html_cache_lock = threading.Lock()
+
+
+def _cached_cf_html(text: str, fmt: str, pandoc_in: str) -> bytes:
+    """Return the CF_HTML blob for *text*, converting only on a cache miss."""
+    key = (hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest(), fmt)
+    with _cf_html_cache_lock:
+        blob = _cf_html_cache.get(key)
+        if blob is not None:
+            _cf_html_cache.move_to_end(key)
+            return blob
+    blob = _build_cf_html(text, fmt, pandoc_in)
+    if len(blob) > _CF_HTML_CACHE_MAX_BYTES:
+        return blob
+    global _cf_html_cache_bytes
+    with _cf_html_cache_lock:
+        old = _cf_html_cache.pop(key, None)
+        if old is not None:
+            _cf_html_cache_bytes -= len(old)
+        _cf_html_cache[key] = blob
+        _cf_html_cache_bytes += len(blob)
+        while (len(_cf_html_cache) > _CF_HTML_CACHE_SIZE
+               or _cf_html_cache_bytes > _CF_HTML_CACHE_MAX_BYTES):
+            _, evicted = _cf_html_cache.popitem(last=False)
+            _cf_html_cache_bytes -= len(evicted)
+    return blob
+
+
+def _build_cf_html(text: str, fmt: str, pandoc_in: str) -> bytes:
+    """Run *text* through Pandoc and wrap the HTML as a CF_HTML blob."""
+    if _PANDOC_EXE is None:
+        raise RuntimeError(
+            "Pandoc is not installed or not on PATH. "
+            "Install it from https://pandoc.org/installing.html"
+        )
+
+    # ── Pre-process math spacing ──────────────────────────────────────────────
+    text = _preprocess_math_spacing(text, fmt)
+
+    # ── Convert to HTML with MathML ───────────────────────────────────────────
+    # We do NOT generate CF_RTF. Pandoc's RTF/OMML writer drops all LaTeX
+    # math-spacing commands (\ , \, , \quad …) with no workaround.
+    # Pandoc's MathML writer handles them correctly via <mspace>, and
+    # Word 2016+ pastes MathML from CF_HTML natively.
+    html_fragment: bytes | None = None
+    try:
+        html_fragment = _pandoc(
+            text, pandoc_in, "html", ["--mathml"], {"html-math-method": "mathml"},
+        )
+    except Exception as exc:
+        raise RuntimeError(f"Conversion failed: {exc}")
+
+    html_fragment = _apply_word_html_styles(html_fragment)
+
+    return _make_cf_html(html_fragment)
 
 
 # ── Public API ────────────────────────────────────────────────────────────────
@@ -214,38 +324,27 @@ def convert_to_clipboard(text: str, fmt: str) -> dict:
     RuntimeError
         If conversion fails (e.g. Pandoc not installed).
     """
-    if fmt not in _PANDOC_INPUT:
+    pandoc_in = _PANDOC_INPUT.get(fmt)
+    if pandoc_in is None:
         raise ValueError(f"Unknown format {fmt!r}. Expected 'markdown' or 'latex'.")
 
-    pandoc_in = _PANDOC_INPUT[fmt]
-    warnings: list[str] = []
+    # Nothing to convert: clear the clipboard without starting Pandoc
+    if not text.strip():
+        win32clipboard.OpenClipboard()
+        try:
+            win32clipboard.EmptyClipboard()
+        finally:
+            win32clipboard.CloseClipboard()
+        return {"formats_written": [], "warnings": ["Input is empty; clipboard cleared."]}
 
-    # ── Pre-process math spacing ──────────────────────────────────────────────
-    text = _preprocess_math_spacing(text, fmt)
-
-    # ── Convert to HTML with MathML ───────────────────────────────────────────
-    # We do NOT generate CF_RTF. Pandoc's RTF/OMML writer drops all LaTeX
-    # math-spacing commands (\ , \, , \quad …) with no workaround.
-    # Pandoc's MathML writer handles them correctly via <mspace>, and
-    # Word 2016+ pastes MathML from CF_HTML natively.
-    html_fragment: str | None = None
-    try:
-        html_fragment = _pandoc(text, pandoc_in, "html", ["--mathml"])
-    except FileNotFoundError:
-        raise RuntimeError(
-            "Pandoc is not installed or not on PATH. "
-            "Install it from https://pandoc.org/installing.html"
-        )
-    except Exception as exc:
-        raise RuntimeError(f"Conversion failed: {exc}")
-
-    html_fragment = _apply_word_html_styles(html_fragment)
+    warnings: list[str] = []
+    cf_html = _cached_cf_html(text, fmt, pandoc_in)
 
     # ── Write CF_HTML to clipboard ────────────────────────────────────────────
     win32clipboard.OpenClipboard()
     try:
         win32clipboard.EmptyClipboard()
-        win32clipboard.SetClipboardData(CF_HTML_FORMAT, _make_cf_html(html_fragment))
+        win32clipboard.SetClipboardData(CF_HTML_FORMAT, cf_html)
     finally:
         win32clipboard.CloseClipboard()
 